@@ -0,0 +1,131 @@
+"""
+Counts squats in every Phyphox CSV export under a directory, using all CPU cores.
+
+Each file is processed in its own worker process. The results are written to a summary table with the
+rep count, duration, sample rate and peak times of every recording; with --plots a signal-plus-peaks
+image is also rendered for each file (headless, no window is opened).
+
+Files are streamed in blocks rather than loaded whole, so memory use per worker stays bounded however
+long a recording is: peaks are found across block boundaries by StreamPeakFinder and the plotted
+signal is a min/max envelope built as the blocks go by.
+
+Usage:
+    python batch_analyze.py recordings/ --summary summary.csv
+    python batch_analyze.py recordings/ --plots plots/ --height 12 --distance 2.5
+
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from phyphox_csv import iter_blocks, StreamPeakFinder
+from downsample import StreamingEnvelope
+
+plot_bins = 2000    # Envelope resolution of the saved plots
+
+def find_exports(directory):
+    for folder, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith('.csv'):
+                yield os.path.join(folder, name)
+
+def plot_peaks(path, envelope, peak_times, peak_values, plot_dir, root):
+    # Agg renders to files only, so this works in worker processes without a display
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 4))
+    ax = fig.add_subplot()
+    ax.plot(*envelope, linewidth=0.8)
+    ax.plot(peak_times, peak_values, 'x')
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Acceleration (m/s^2)')
+    ax.set_title(f'{os.path.relpath(path, root)}: {len(peak_times)} reps')
+
+    image = os.path.join(plot_dir, os.path.splitext(os.path.relpath(path, root))[0] + '.png')
+    os.makedirs(os.path.dirname(image), exist_ok=True)
+    fig.savefig(image, dpi=100)
+
+def analyze_file(path, column, height, distance, plot_dir, root):
+    """
+    Counts the reps in one export and returns a summary row (runs in a worker process).
+
+    """
+    row = {'file': os.path.relpath(path, root), 'reps': None, 'duration': None, 'sample_rate': None,
+           'samples': None, 'peak_times': '', 'error': ''}
+    try:
+        finder = None
+        envelope = StreamingEnvelope(plot_bins) if plot_dir else None
+        peaks = []
+        samples, first_time, last_time = 0, None, None
+        for block in iter_blocks(path, ('t', column)):
+            t, signal = block['t'], block[column]
+            if not len(t):
+                continue
+            if finder is None:
+                # Distance is given in seconds; convert it with this recording's own sample rate,
+                # estimated from the first block
+                if len(t) < 2:
+                    raise ValueError("not enough samples")
+                finder = StreamPeakFinder(height, max(1, int(distance / np.median(np.diff(t)))))
+                first_time = t[0]
+            peaks += finder.feed(t, signal)
+            if envelope is not None:
+                envelope.add(t, signal)
+            samples += len(t)
+            last_time = t[-1]
+        if finder is None:
+            raise ValueError("not enough samples")
+        peaks += finder.finish()
+
+        duration = last_time - first_time
+        peak_times = [peak[1] for peak in peaks]
+        row.update(reps=len(peaks), duration=round(duration, 3), sample_rate=round((samples - 1) / duration, 2),
+                   samples=samples, peak_times=' '.join(f'{peak:.2f}' for peak in peak_times))
+        if plot_dir:
+            plot_peaks(path, envelope.result(), peak_times, [peak[2] for peak in peaks], plot_dir, root)
+    except KeyError as e:
+        row['error'] = f'missing column {e}'
+    except (OSError, ValueError, pd.errors.ParserError) as e:
+        row['error'] = f'{type(e).__name__}: {e}'
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="Count squats in a folder of Phyphox CSV exports")
+    parser.add_argument('directory', help="folder searched recursively for .csv exports")
+    parser.add_argument('--summary', default='summary.csv', help="output table (default: summary.csv)")
+    parser.add_argument('--plots', metavar='DIR', help="also save a peak plot per file in this folder")
+    parser.add_argument('--column', choices=['x', 'y', 'z', 'abs'], default='z', help="signal to count on")
+    parser.add_argument('--height', type=float, default=12.0, help="acceleration threshold (m/s^2)")
+    parser.add_argument('--distance', type=float, default=2.5, help="minimum time between reps (seconds)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    paths = list(find_exports(args.directory))
+    if not paths:
+        print(f"No CSV files found in {args.directory}", file=sys.stderr)
+        return
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(analyze_file, path, args.column, args.height, args.distance, args.plots, args.directory)
+                   for path in paths]
+        for done, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            rows.append(row)
+            status = row['error'] or f"{row['reps']} reps"
+            print(f"[{done}/{len(paths)}] {row['file']}: {status}", file=sys.stderr)
+
+    summary = pd.DataFrame(rows).sort_values('file').astype({'reps': 'Int64', 'samples': 'Int64'})
+    summary.to_csv(args.summary, index=False)
+    print(f"Analyzed {len(paths)} files in {time.perf_counter() - start:.1f} s; "
+          f"{int(summary['reps'].fillna(0).sum())} reps in total. Summary written to {args.summary}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Calibration of the detection settings from a few recorded reps.
+
+The user does about five squats while the resampled signal is recorded. The recording is then analyzed
+in one pass: the most prominent peaks are taken as the reps, and the settings are placed between what
+the reps look like and what the rest of the signal does:
+
+    height_threshold   halfway between the weakest rep and the highest other peak
+    distance           half the shortest time between two reps
+    min_peak_interval  60% of the shortest time between two reps (bumps closer than this to a rep are
+                       part of it and ignored when placing the height threshold)
+    window             three times the typical time between reps (the shortest window that still holds
+                       a full rep on either side of a peak)
+
+The settings are saved in profiles.json as the profile of the current user (see history.py); the
+profile of the user selected last is loaded at startup.
+
+"""
+
+import json
+import os
+import numpy as np
+from scipy.signal import find_peaks, peak_prominences
+
+profiles_file = 'profiles.json'
+calibration_reps = 5            # Reps the user is asked to do
+calibration_max_time = 40       # Recording stops by itself after this many seconds
+
+# Limits of the corresponding sliders in the GUI
+height_limits = (10.0, 15.0)
+min_peak_interval_limits = (0.5, 2.0)
+window_limits = (10, 50)
+
+def analyze_reps(times, values, expected_reps=calibration_reps):
+    """
+    Proposes detection settings from a recording of `expected_reps` reps (evenly spaced samples with
+    their times in seconds). Returns a dict with height_threshold, distance, min_peak_interval, window
+    and the reps found; raises ValueError if the recording doesn't contain enough clear reps.
+
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(values) < 3:
+        raise ValueError("nothing was recorded")
+    sample_period = (times[-1] - times[0]) / (len(times) - 1)
+    baseline = np.median(values)
+
+    # Every local maximum above the resting level, ranked by how much it stands out
+    peaks, _ = find_peaks(values, height=baseline, distance=max(1, round(0.3 / sample_period)))
+    if len(peaks) < expected_reps:
+        raise ValueError(f"only {len(peaks)} reps found, expected {expected_reps}")
+    prominences = peak_prominences(values, peaks)[0]
+    ranked = np.argsort(prominences)[::-1]
+    reps = np.sort(peaks[ranked[:expected_reps]])
+    others = peaks[ranked[expected_reps:]]
+
+    intervals = np.diff(times[reps])
+    shortest = intervals.min()
+    min_peak_interval = float(np.clip(0.6 * shortest, *min_peak_interval_limits))
+
+    # Bumps within the refractory time of a rep belong to that rep and can't be counted anyway
+    gaps_to_reps = np.abs(times[others][:, np.newaxis] - times[reps][np.newaxis, :]).min(axis=1)
+    others = others[gaps_to_reps > min_peak_interval]
+    weakest_rep = values[reps].min()
+    highest_other = values[others].max() if len(others) else baseline
+    if weakest_rep - highest_other < 0.5:
+        raise ValueError("the reps don't stand out from the rest of the signal")
+
+    return {
+        'height_threshold': round(float(np.clip((weakest_rep + highest_other) / 2, *height_limits)), 2),
+        'distance': round(float(shortest / 2), 2),
+        'min_peak_interval': round(min_peak_interval, 2),
+        'window': int(np.clip(np.ceil(3 * np.median(intervals)), *window_limits)),
+        'rep_times': [round(float(t), 2) for t in times[reps]],
+    }
+
+def load_profiles():
+    """
+    Returns the saved profiles as {'last': name or None, 'profiles': {name: settings}}.
+
+    """
+    try:
+        with open(profiles_file) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {'last': None, 'profiles': {}}
+    return {'last': data.get('last'), 'profiles': data.get('profiles', {})}
+
+def write_profiles(data):
+    temp_file = profiles_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_file, profiles_file)
+
+def save_profile(name, settings):
+    # Saved profiles become the one loaded at the next start
+    data = load_profiles()
+    data['profiles'][name] = {key: value for key, value in settings.items() if key != 'rep_times'}
+    data['last'] = name
+    write_profiles(data)
+
+def remember_user(name):
+    # The user selected last is selected again at the next start
+    data = load_profiles()
+    if data['last'] != name:
+        data['last'] = name
+        write_profiles(data)
+
+def last_profile():
+    """
+    Returns (name, settings) of the user selected last; settings is None if that user hasn't
+    calibrated, and name is None if no user was ever selected.
+
+    """
+    data = load_profiles()
+    name = data['last']
+    return name, data['profiles'].get(name)
+
+def get_profile(name):
+    return load_profiles()['profiles'].get(name)
@@ -0,0 +1,138 @@
+"""
+Movement classification over sliding windows of the x/y/z acceleration stream.
+
+Squats, lunges and jumps all push the acceleration over the height threshold, so reps are only counted
+while the movement looks like squats. The raw phone samples (full sensor rate, no resampling) are cut
+into overlapping windows with numpy stride tricks (sliding_window_view, no copies) and every window is
+described by a few features computed for all windows at once:
+
+    energy              variance of the acceleration vector (m^2/s^4); near zero at rest
+    vertical_share      share of the energy along gravity (the mean direction of the window), so the
+                        phone's orientation doesn't matter; stepping moves the body sideways
+    axis_shares         share of the energy on each phone axis (x, y, z)
+    dominant_frequency  strongest frequency of the vertical acceleration (Hz); squats are slow
+    min_magnitude       smallest |a| (m/s^2); close to zero in the flight phase of a jump
+    max_magnitude       largest |a| (m/s^2); landings are hard
+
+and labelled with simple rules:
+
+    rest    energy below rest_energy
+    jump    a flight phase (min_magnitude below free_fall) or a hard landing (max_magnitude above landing)
+    lunge   less than min_vertical_share of the energy is vertical
+    other   faster than max_squat_frequency (jogging, bouncing)
+    squat   everything else
+
+"""
+
+from collections import Counter
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+labels = ('rest', 'squat', 'lunge', 'jump', 'other')
+counted_labels = {'rest', 'squat'}  # Reps are counted while the latest window has one of these labels
+
+rest_energy = 0.5           # (m/s^2)^2
+free_fall = 3.0             # m/s^2
+landing = 30.0              # m/s^2
+min_vertical_share = 0.5
+max_squat_frequency = 1.5   # Hz
+
+def window_features(windows, sample_rate):
+    """
+    Features of acceleration windows shaped (windows, 3 axes, samples), as a dict of arrays with one
+    value (or row, for axis_shares) per window.
+
+    """
+    mean = windows.mean(axis=2)
+    gravity = mean / np.maximum(np.linalg.norm(mean, axis=1, keepdims=True), 1e-9)
+    centered = windows - mean[:, :, np.newaxis]
+    axis_energy = (centered ** 2).mean(axis=2)
+    energy = axis_energy.sum(axis=1)
+    vertical = np.einsum('wan,wa->wn', centered, gravity)
+    vertical_energy = (vertical ** 2).mean(axis=1)
+
+    # Strongest frequency of the vertical motion, leaving out the constant part
+    spectrum = np.abs(np.fft.rfft(vertical * np.hanning(windows.shape[2]), axis=1))
+    frequencies = np.fft.rfftfreq(windows.shape[2], 1 / sample_rate)
+    dominant_frequency = frequencies[1 + np.argmax(spectrum[:, 1:], axis=1)]
+
+    magnitude = np.linalg.norm(windows, axis=1)
+    safe_energy = np.maximum(energy, 1e-12)
+    return {
+        'energy': energy,
+        'vertical_share': vertical_energy / safe_energy,
+        'axis_shares': axis_energy / safe_energy[:, np.newaxis],
+        'dominant_frequency': dominant_frequency,
+        'min_magnitude': magnitude.min(axis=1),
+        'max_magnitude': magnitude.max(axis=1),
+    }
+
+def classify(features):
+    """
+    Labels windows from their features (see window_features). Returns an array of label strings.
+
+    """
+    result = np.full(len(features['energy']), 'squat', dtype=object)
+    result[features['dominant_frequency'] > max_squat_frequency] = 'other'
+    result[features['vertical_share'] < min_vertical_share] = 'lunge'
+    result[(features['min_magnitude'] < free_fall) | (features['max_magnitude'] > landing)] = 'jump'
+    result[features['energy'] < rest_energy] = 'rest'
+    return result
+
+def classify_recording(times, x, y, z, window=3.0, step=0.5):
+    """
+    Labels a whole recording at once. Returns (end times of the windows, labels).
+
+    """
+    classifier = MovementClassifier(window, step)
+    results = classifier.add(times, x, y, z)
+    return np.array([t for t, _ in results]), np.array([label for _, label in results], dtype=object)
+
+class MovementClassifier:
+    """
+    Streams raw (times, x, y, z) samples and labels a `window`-second window every `step` seconds. The
+    sample rate is estimated from the first samples. Only the samples of the current window are kept.
+
+    """
+    def __init__(self, window=3.0, step=0.5):
+        self.window = window
+        self.step = step
+        self.sample_rate = None
+        self.pending = np.empty((0, 4))     # Rows of (time, x, y, z) not yet past the last window start
+        self.label = None                   # Label of the latest window
+        self.counts = Counter()             # Windows per label
+
+    def reset(self):
+        self.pending = np.empty((0, 4))
+        self.label = None
+
+    def add(self, times, x, y, z):
+        """
+        Adds samples and returns (end time, label) of the windows they complete, oldest first.
+
+        """
+        block = np.column_stack([times, x, y, z]).astype(float)
+        block = block[np.isfinite(block).all(axis=1)]
+        self.pending = np.concatenate([self.pending, block])
+        if self.sample_rate is None:
+            if len(self.pending) < 20:
+                return []
+            self.sample_rate = 1 / np.median(np.diff(self.pending[:, 0]))
+        size = max(8, round(self.window * self.sample_rate))
+        stride = max(1, round(self.step * self.sample_rate))
+        if len(self.pending) < size:
+            return []
+
+        # Windows are views into pending: shape (windows, 4 columns, samples)
+        windows = sliding_window_view(self.pending, size, axis=0)[::stride]
+        window_labels = classify(window_features(windows[:, 1:, :], self.sample_rate))
+        end_times = windows[:, 0, -1]
+        # Keep what the next window needs
+        self.pending = self.pending[len(windows) * stride:]
+
+        self.label = window_labels[-1]
+        self.counts.update(window_labels)
+        return list(zip(end_times.tolist(), window_labels.tolist()))
+
+    def allows_counting(self):
+        return self.label is None or self.label in counted_labels
@@ -0,0 +1,65 @@
+"""
+Compares the detection engines (see detector.py) on Phyphox recordings.
+
+Each recording is replayed the way the app sees it: resampled in blocks of one poll interval, every
+engine fed the same blocks. For every engine the squats counted, the CPU time per sample and the
+agreement with the first engine are printed, so you can check that a cheaper engine counts the same
+reps before using it on a low-power machine.
+
+Usage:
+    python compare_engines.py helpful-scripts/4_squats.csv
+    python compare_engines.py recordings/ --engines peaks hysteresis --height 12
+
+"""
+
+import argparse
+import os
+import numpy as np
+from phyphox_csv import read_export
+from resampler import Resampler
+from detector import engines, EngineComparison, detector_from_args, add_arguments as add_detector_arguments
+from batch_analyze import find_exports
+
+def compare_file(path, args):
+    df = read_export(path)
+    t = df['t'].to_numpy(dtype=float)
+    values = df[args.column].to_numpy(dtype=float)
+    resampler = Resampler(args.rate)
+    comparison = EngineComparison({engine: detector_from_args(args, engine) for engine in args.engines})
+    # Blocks of one poll interval, like the live app's ticks
+    bounds = np.append(np.searchsorted(t, np.arange(t[0], t[-1], args.poll)), len(t))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        block_times, block_values = resampler.feed(t[start:end], values[start:end])
+        comparison.extend(block_values, block_times)
+    return comparison.report()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the CPU cost and counts of the detection engines")
+    parser.add_argument('paths', nargs='+', help="Phyphox CSV exports, or folders searched for them")
+    parser.add_argument('--engines', nargs='+', choices=list(engines), default=list(engines),
+                        help="engines to compare; the first is the reference")
+    parser.add_argument('--column', choices=['z', 'abs'], default='z', help="signal to count on")
+    parser.add_argument('--poll', type=float, default=0.1, help="seconds per block, as in the app")
+    parser.add_argument('--rate', type=float, default=50, help="samples per second the signal is resampled to")
+    add_detector_arguments(parser)
+    args = parser.parse_args()
+
+    files = [file for path in args.paths for file in (find_exports(path) if os.path.isdir(path) else [path])]
+    totals = {engine: {'squats': 0, 'matched': 0, 'cpu_seconds': 0.0} for engine in args.engines}
+    print(f"{'file':40} {'engine':12} {'squats':>6} {'us/sample':>10} {'agreement':>10}")
+    for path in files:
+        for row in compare_file(path, args):
+            print(f"{os.path.basename(path)[:40]:40} {row['engine']:12} {row['squats']:6} {row['us_per_sample']:10.2f} {row['agreement']:10.0%}")
+            for key in totals[row['engine']]:
+                totals[row['engine']][key] += row[key]
+
+    reference = totals[args.engines[0]]
+    print(f"\nTotal over {len(files)} file(s):")
+    for engine, total in totals.items():
+        agreement = total['matched'] / max(reference['squats'], total['squats'], 1)
+        relative_cost = total['cpu_seconds'] / reference['cpu_seconds'] if reference['cpu_seconds'] else float('nan')
+        print(f"  {engine:12} {total['squats']:6} squats, {total['cpu_seconds']:.3f} s CPU "
+              f"({relative_cost:.0%} of {args.engines[0]}), agreement {agreement:.0%}")
+
+if __name__ == '__main__':
+    main()
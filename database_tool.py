@@ -0,0 +1,144 @@
+"""
+Bulk import/export of the squat history database (see history.py).
+
+Files are streamed in bounded chunks, so seeding the database from old logs or migrating years of
+history from another machine never loads a whole file into memory.
+
+Usage:
+    python database_tool.py import old_database.csv other_machine.csv --user alice
+    python database_tool.py export backup.csv --year 2024
+    python database_tool.py leaderboard --year 2024 --month 5
+
+CSV files have Day, Month, Year and Count columns, and optionally a User column; rows without a user
+are imported for --user.
+
+"""
+
+import argparse
+import csv
+import sys
+import time
+import numpy as np
+import pandas as pd
+import history
+from functions import database_columns
+
+chunk_size = 100000     # Rows processed per chunk (bounds memory use)
+
+def date_keys(df):
+    # Encode (Day, Month, Year) as a single integer so membership checks stay vectorized
+    return df['Year'].to_numpy(dtype=np.int64) * 10000 + df['Month'].to_numpy(dtype=np.int64) * 100 + df['Day'].to_numpy(dtype=np.int64)
+
+def existing_date_keys(connection, user):
+    """
+    Returns the (Day, Month, Year) keys a user already has in the database as a sorted numpy array.
+
+    """
+    rows = connection.execute('SELECT DISTINCT year * 10000 + month * 100 + day FROM sets WHERE user = ?', (user,))
+    return np.sort(np.fromiter((key for key, in rows), dtype=np.int64))
+
+def clean_chunk(chunk, default_user):
+    """
+    Keeps only well-formed rows: all four columns numeric, a plausible date and a non-negative count.
+    Rows without a user get default_user.
+
+    """
+    missing = [column for column in database_columns if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"missing column(s): {', '.join(missing)}")
+    users = chunk['User'].fillna(default_user).astype(str) if 'User' in chunk.columns else pd.Series(default_user, index=chunk.index)
+    chunk = chunk[database_columns].apply(pd.to_numeric, errors='coerce').dropna()
+    valid = (chunk['Day'].between(1, 31) & chunk['Month'].between(1, 12) &
+             chunk['Year'].between(1970, 2100) & (chunk['Count'] >= 0))
+    chunk = chunk[valid].astype(np.int64)
+    chunk['User'] = users[chunk.index]
+    return chunk
+
+def import_files(paths, default_user):
+    totals = {'read': 0, 'invalid': 0, 'duplicate': 0, 'imported': 0}
+    existing = {}   # user -> sorted date keys already in the database
+
+    with history.transaction() as connection:
+        for path in paths:
+            imported_keys = {}
+            try:
+                for chunk in pd.read_csv(path, chunksize=chunk_size):
+                    totals['read'] += len(chunk)
+                    cleaned = clean_chunk(chunk, default_user)
+                    totals['invalid'] += len(chunk) - len(cleaned)
+
+                    for user, rows in cleaned.groupby('User'):
+                        if user not in existing:
+                            existing[user] = existing_date_keys(connection, user)
+                        # Skip days the database already has, so re-running an import is harmless
+                        keys = date_keys(rows)
+                        duplicate = np.isin(keys, existing[user])
+                        fresh = rows[~duplicate]
+                        totals['duplicate'] += int(duplicate.sum())
+
+                        connection.execute('INSERT OR IGNORE INTO users VALUES (?, ?)', (user, int(time.time())))
+                        connection.executemany(
+                            'INSERT INTO sets (user, year, month, day, session, count) VALUES (?, ?, ?, ?, NULL, ?)',
+                            zip([user] * len(fresh), *(fresh[column].tolist() for column in ['Year', 'Month', 'Day', 'Count'])))
+                        totals['imported'] += len(fresh)
+                        imported_keys.setdefault(user, []).append(np.unique(keys[~duplicate]))
+            except (OSError, ValueError, pd.errors.ParserError) as e:
+                print(f"Error: Could not import {path}: {e}", file=sys.stderr)
+            # Days from this file count as existing for the next one (several sets on one day stay together)
+            for user, keys in imported_keys.items():
+                existing[user] = np.union1d(existing[user], np.concatenate(keys))
+
+    print(f"Read {totals['read']} rows: imported {totals['imported']}, "
+          f"skipped {totals['duplicate']} duplicate and {totals['invalid']} invalid")
+
+def export_file(path, year=None, month=None, user=None):
+    conditions = [(column, value) for column, value in (('user', user), ('year', year), ('month', month)) if value is not None]
+    where = ' WHERE ' + ' AND '.join(f'{column} = ?' for column, _ in conditions) if conditions else ''
+    exported = 0
+    with history.transaction() as connection, open(path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(database_columns + ['User'])
+        cursor = connection.execute(f'SELECT day, month, year, count, user FROM sets{where} ORDER BY year, month, day',
+                                    [value for _, value in conditions])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+            exported += len(rows)
+    print(f"Exported {exported} rows to {path}")
+
+def print_leaderboard(year, month, top):
+    print(f"Leaderboard for {month}/{year}:")
+    for place, (user, total) in enumerate(history.leaderboard(year, month, top), 1):
+        print(f"{place:4}. {user:20} {total}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of the squat history database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help=f"add CSV files to {history.history_file}")
+    import_parser.add_argument('files', nargs='+', help="CSV files with Day, Month, Year and Count (and optionally User) columns")
+    import_parser.add_argument('--user', default=history.default_user, help="user of rows without a User column")
+
+    export_parser = subparsers.add_parser('export', help=f"copy {history.history_file} to a CSV file")
+    export_parser.add_argument('file', help="output CSV file")
+    export_parser.add_argument('--year', type=int, help="only export this year")
+    export_parser.add_argument('--month', type=int, help="only export this month (1-12)")
+    export_parser.add_argument('--user', help="only export this user")
+
+    leaderboard_parser = subparsers.add_parser('leaderboard', help="show the users with the most squats in a month")
+    leaderboard_parser.add_argument('--year', type=int, required=True)
+    leaderboard_parser.add_argument('--month', type=int, required=True)
+    leaderboard_parser.add_argument('--top', type=int, default=10, help="number of users shown")
+
+    args = parser.parse_args()
+    if args.command == 'import':
+        import_files(args.files, args.user)
+    elif args.command == 'export':
+        export_file(args.file, args.year, args.month, args.user)
+    else:
+        print_leaderboard(args.year, args.month, args.top)
+
+if __name__ == '__main__':
+    main()
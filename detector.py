@@ -0,0 +1,379 @@
+"""
+Squat detection engines.
+
+This is the counting pipeline shared by the GUI (main.py) and the headless mode (headless.py); it has
+no dependency on Tk or matplotlib. The input is an evenly spaced stream (see resampler.py), so the window
+and distances are given in seconds and converted with the sample rate.
+
+Engines (see `engines`) share one interface: the constructor takes the detection settings (and the
+engine's own `settings` as keywords), extend() takes a block of samples and returns the times of the
+squats it completed, and data_buffer / peaks / buffer_size describe the moving window for the live plot.
+
+    peaks        find_peaks over a moving window (SquatDetector); the reference
+    adaptive     the same, with the window sized to the user's tempo (SquatDetector with adaptive=True)
+    hysteresis   Schmitt-trigger state machine (HysteresisDetector); constant work per sample and
+                 almost no state, for low-power machines
+
+EngineComparison runs several engines on the same stream and reports their CPU cost and agreement.
+add_arguments and detector_from_args give every entry point the same command line options.
+
+"""
+
+import time
+from collections import deque
+
+# numpy and scipy are slow to import, so they are loaded with the first detector: the app parses the
+# detection options (see add_arguments) before its window is up
+np = None
+find_peaks = None
+
+def load_numeric_modules():
+    global np, find_peaks
+    if find_peaks is None:
+        import numpy as np
+        from scipy.signal import find_peaks
+
+default_hysteresis = 1.0            # Falling threshold of the hysteresis engine below the rising one (m/s^2)
+
+# Adaptive window: a multiple of the recent time between reps, between min_adaptive_window and the window
+adaptive_reps = 5                   # Intervals between the latest reps the tempo is taken from (median)
+default_adaptive_multiple = 3.0     # Typical rep intervals the window holds
+default_min_adaptive_window = 5.0   # Seconds
+
+class MovingWindow:
+    """
+    The latest `size` samples of a stream. Appending works in place in room for two windows; the window
+    is only moved back to the front of the storage once it reaches the end, so a tick doesn't copy the
+    whole window.
+
+    """
+    def __init__(self):
+        load_numeric_modules()
+        self.values = np.empty(0)               # The window (a view into storage)
+        self.storage = np.empty(0)
+        self.start = self.end = 0               # Position of the window in storage
+
+    def append(self, values, size):
+        values = values[-size:]
+        if len(self.storage) != 2 * size:
+            # First call, or the window length changed: keep as much of the window as still fits
+            kept = self.values[-size:]
+            self.storage = np.empty(2 * size)
+            self.storage[:len(kept)] = kept
+            self.start, self.end = 0, len(kept)
+        if self.end + len(values) > len(self.storage):
+            keep = min(size - len(values), self.end - self.start)
+            self.storage[:keep] = self.storage[self.end - keep:self.end]
+            self.start, self.end = 0, keep
+        self.storage[self.end:self.end + len(values)] = values
+        self.end += len(values)
+        self.start = max(self.start, self.end - size)
+        self.values = self.storage[self.start:self.end]
+
+class SquatDetector:
+    """
+    find_peaks over a moving window. With `adaptive`, the window is sized to the user's tempo instead:
+    adaptive_multiple times the median of the latest rep intervals, within min_adaptive_window and
+    `window`, so the samples find_peaks scans per tick follow the tempo rather than the slowest user.
+    Until two reps are seen the full window is used.
+
+    """
+    settings = ()           # Engine-specific keyword settings (see make_detector)
+    def __init__(self, window=50.0, height_threshold=11.5, distance=0.8, min_peak_interval=1.0, sample_rate=50.0,
+                 adaptive=False, adaptive_multiple=default_adaptive_multiple, min_adaptive_window=default_min_adaptive_window):
+        load_numeric_modules()
+        self.window = window                            # Moving window length (seconds); the upper bound if adaptive
+        self.height_threshold = height_threshold        # Minimum peak acceleration (m/s^2)
+        self.distance = distance                        # Minimum time between peaks (seconds)
+        self.min_peak_interval = min_peak_interval      # Minimum time between two squats (seconds)
+        self.sample_rate = sample_rate                  # Samples per second of the input stream
+        self.adaptive = adaptive
+        self.adaptive_multiple = adaptive_multiple      # Rep intervals the adaptive window holds
+        self.min_adaptive_window = min_adaptive_window  # Smallest adaptive window (seconds)
+
+        self.moving_window = MovingWindow()
+        self.peaks = np.empty(0, dtype=int)     # Peak indices in data_buffer
+        self.samples_seen = 0
+        self.last_peak = -1                     # Sample number of the latest peak already examined
+        self.last_peak_time = float('-inf')
+        self.rep_intervals = deque(maxlen=adaptive_reps)
+        self.tempo_window = None                # Window sized to the tempo (seconds), once it is known
+        self.scanned = 0                        # Samples find_peaks scanned
+        self.scanned_full = 0                   # Samples it would have scanned with the full window
+        self.cpu_time = 0.0                     # CPU seconds spent in extend()
+
+    def adapt_window(self):
+        # Called when a rep interval is added, so the median isn't recomputed on every tick
+        if self.adaptive and len(self.rep_intervals) >= 2:
+            # Rounded to half seconds, so the window isn't resized on every rep
+            size = round(self.adaptive_multiple * float(np.median(self.rep_intervals)) * 2) / 2
+            self.tempo_window = max(self.min_adaptive_window, size)
+
+    @property
+    def current_window(self):
+        # Window length in use (seconds); `window` stays the upper bound when it is changed
+        return self.window if self.tempo_window is None else min(self.window, self.tempo_window)
+
+    @property
+    def buffer_size(self):
+        return max(2, round(self.current_window * self.sample_rate))
+
+    @property
+    def distance_samples(self):
+        return max(1, round(self.distance * self.sample_rate))
+
+    @property
+    def data_buffer(self):
+        return self.moving_window.values
+
+    def extend(self, values, times):
+        """
+        Adds a block of evenly spaced samples (with their times in seconds) to the moving window and
+        returns the times of the squats completed by it, oldest first.
+
+        """
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return []
+        # Thread CPU time, so other threads (stations, the UI) don't count
+        start = time.thread_time()
+        self.moving_window.append(values, self.buffer_size)
+        self.samples_seen += len(values)
+        self.peaks, _ = find_peaks(self.data_buffer, height=self.height_threshold, distance=self.distance_samples)
+        self.scanned += len(self.data_buffer)
+        self.scanned_full += min(self.samples_seen, max(2, round(self.window * self.sample_rate)))
+
+        # Sample numbers of the peaks, so they can be recognized as the window moves on
+        first_sample = self.samples_seen - len(self.data_buffer)
+        last_time = times[-1]
+        squat_times = []
+        for peak in self.peaks + first_sample:
+            if peak <= self.last_peak:
+                continue
+            self.last_peak = peak
+            peak_time = last_time - (self.samples_seen - 1 - peak) / self.sample_rate
+            if peak_time - self.last_peak_time > self.min_peak_interval:
+                if self.last_peak_time != float('-inf'):
+                    self.rep_intervals.append(peak_time - self.last_peak_time)
+                    self.adapt_window()
+                self.last_peak_time = peak_time
+                squat_times.append(peak_time)
+        self.cpu_time += time.thread_time() - start
+        return squat_times
+
+    def window_stats(self):
+        """
+        Returns the window in use (seconds and samples), the samples find_peaks scanned as a share of
+        those a full window would have had, and the CPU time spent in extend() (seconds, and microseconds
+        per sample). The CPU time a full window would have taken isn't known here: compare_engines.py
+        measures it against the peaks engine.
+
+        """
+        scanned_share = self.scanned / self.scanned_full if self.scanned_full else 1.0
+        return {'window': self.current_window, 'buffer_size': self.buffer_size, 'scanned_share': round(scanned_share, 3),
+                'cpu_seconds': round(self.cpu_time, 4), 'us_per_sample': round(self.cpu_time / max(self.samples_seen, 1) * 1e6, 2)}
+
+class AdaptiveSquatDetector(SquatDetector):
+    settings = ('adaptive_multiple', 'min_adaptive_window')
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, adaptive=True, **kwargs)
+
+class HysteresisDetector:
+    """
+    Schmitt-trigger detector: a rep starts when the signal rises above height_threshold and ends when it
+    falls back below height_threshold - hysteresis. It is counted at its highest sample, unless that is
+    within min_peak_interval of the previous rep. The work per sample is constant and the state is a
+    handful of numbers; the moving window is only kept (for the live plot) with keep_window.
+    `distance` is accepted for compatibility: bumps within one rep never leave the upper state anyway.
+
+    """
+    settings = ('hysteresis',)
+    def __init__(self, window=50.0, height_threshold=11.5, distance=0.8, min_peak_interval=1.0, sample_rate=50.0,
+                 hysteresis=default_hysteresis):
+        load_numeric_modules()
+        self.window = window
+        self.height_threshold = height_threshold
+        self.distance = distance
+        self.min_peak_interval = min_peak_interval
+        self.sample_rate = sample_rate
+        self.hysteresis = hysteresis            # Distance of the falling threshold below the rising one (m/s^2)
+        self.keep_window = False
+
+        self.in_rep = False                     # Above the rising threshold and not yet below the falling one
+        self.peak_value = float('-inf')         # Highest sample of the current rep
+        self.peak_sample = -1                   # Its sample number
+        self.samples_seen = 0
+        self.last_peak_time = float('-inf')
+        self.rep_samples = deque()              # Sample numbers of the reps in the window (for the live plot)
+        self.moving_window = MovingWindow()
+
+    @property
+    def buffer_size(self):
+        return max(2, round(self.window * self.sample_rate))
+
+    @property
+    def data_buffer(self):
+        return self.moving_window.values
+
+    @property
+    def peaks(self):
+        # Rep indices in data_buffer
+        first_sample = self.samples_seen - len(self.data_buffer)
+        return np.array([sample - first_sample for sample in self.rep_samples if sample >= first_sample], dtype=int)
+
+    def extend(self, values, times):
+        """
+        Adds a block of evenly spaced samples (with their times in seconds) and returns the times of the
+        squats completed by it, oldest first.
+
+        """
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return []
+        rising = self.height_threshold
+        falling = self.height_threshold - self.hysteresis
+        last_sample = self.samples_seen + len(values) - 1
+        last_time = times[-1]
+        squat_times = []
+        for sample, value in enumerate(values.tolist(), self.samples_seen):
+            if self.in_rep:
+                if value > self.peak_value:
+                    self.peak_value, self.peak_sample = value, sample
+                elif value < falling:
+                    self.in_rep = False
+                    peak_time = last_time - (last_sample - self.peak_sample) / self.sample_rate
+                    if peak_time - self.last_peak_time > self.min_peak_interval:
+                        self.last_peak_time = peak_time
+                        squat_times.append(peak_time)
+                        self.rep_samples.append(self.peak_sample)
+            elif value > rising:
+                self.in_rep = True
+                self.peak_value, self.peak_sample = value, sample
+        self.samples_seen += len(values)
+
+        if self.keep_window:
+            self.moving_window.append(values, self.buffer_size)
+        while self.rep_samples and self.rep_samples[0] < self.samples_seen - self.buffer_size:
+            self.rep_samples.popleft()
+        return squat_times
+
+# Detection engines by name
+engines = {'peaks': SquatDetector, 'adaptive': AdaptiveSquatDetector, 'hysteresis': HysteresisDetector}
+default_engine = 'peaks'
+
+common_settings = ('window', 'height_threshold', 'distance', 'min_peak_interval', 'sample_rate')
+
+def make_detector(engine=default_engine, *args, **settings):
+    """
+    Creates a detector of the named engine with the settings of SquatDetector. Keyword settings other
+    than the common ones are engine-specific (e.g. hysteresis); each engine only gets those in its
+    `settings`, so callers can pass them all whatever the engine.
+
+    """
+    engine_class = engines[engine]
+    return engine_class(*args, **{name: value for name, value in settings.items()
+                                  if name in common_settings or name in engine_class.settings})
+
+# Detector settings by the command line option (argparse dest) they come from
+option_settings = {'window': 'window', 'height': 'height_threshold', 'distance': 'distance', 'interval': 'min_peak_interval',
+                   'rate': 'sample_rate', 'hysteresis': 'hysteresis', 'adaptive_multiple': 'adaptive_multiple',
+                   'min_adaptive_window': 'min_adaptive_window'}
+
+def add_arguments(parser, thresholds=True):
+    """
+    Adds the detection settings to an argparse parser. Without `thresholds` only the engine-specific
+    ones are added (the app sets the others with its sliders). The sample rate is left to the caller,
+    since it is the resampler's too.
+
+    """
+    if thresholds:
+        parser.add_argument('--height', type=float, default=11.5, help="acceleration threshold (m/s^2)")
+        parser.add_argument('--distance', type=float, default=0.8, help="minimum time between peaks (seconds)")
+        parser.add_argument('--window', type=float, default=50, help="moving window length (seconds)")
+        parser.add_argument('--interval', type=float, default=1.0, help="minimum time between squats (seconds)")
+    parser.add_argument('--hysteresis', type=float, default=default_hysteresis,
+                        help="distance of the falling threshold below the rising one for the hysteresis engine (m/s^2)")
+    parser.add_argument('--adaptive-multiple', type=float, default=default_adaptive_multiple,
+                        help="rep intervals the adaptive engine's window holds")
+    parser.add_argument('--min-adaptive-window', type=float, default=default_min_adaptive_window,
+                        help="smallest window of the adaptive engine (seconds)")
+
+def detector_from_args(args, engine, **settings):
+    """
+    Creates a detector of the named engine from the options of add_arguments (and args.rate, if there is
+    one). Keyword settings (SquatDetector's parameter names) take the place of options.
+
+    """
+    values = {name: getattr(args, option) for option, name in option_settings.items() if hasattr(args, option)}
+    values.update(settings)
+    return make_detector(engine, **values)
+
+def count_matches(reference, other, tolerance):
+    # Pairs squat times (both sorted) that are within `tolerance` seconds of each other
+    i = j = matched = 0
+    while i < len(reference) and j < len(other):
+        difference = other[j] - reference[i]
+        if abs(difference) <= tolerance:
+            matched += 1
+            i += 1
+            j += 1
+        elif difference < 0:
+            j += 1
+        else:
+            i += 1
+    return matched
+
+class EngineComparison:
+    """
+    Runs several detectors ({name: detector}) on the same stream. extend() returns the squats of the first
+    one, so it can stand in for a single detector; report() compares the others with it.
+
+    """
+    def __init__(self, detectors):
+        self.detectors = detectors
+        self.cpu_time = dict.fromkeys(detectors, 0.0)           # CPU seconds spent in extend(), per engine
+        self.squat_times = {name: [] for name in detectors}
+        self.samples = 0
+        self.blocks = 0
+
+    def extend(self, values, times):
+        self.samples += len(values)
+        self.blocks += 1
+        names = list(self.detectors)
+        # The engine run first on a block pays for the cold caches, so the order rotates every block
+        first = self.blocks % len(names)
+        results = {}
+        for name in names[first:] + names[:first]:
+            # Thread CPU time, so other threads (stations, the UI) don't count
+            start = time.thread_time()
+            squat_times = self.detectors[name].extend(values, times)
+            self.cpu_time[name] += time.thread_time() - start
+            self.squat_times[name].extend(float(t) for t in squat_times)
+            results[name] = squat_times
+        return results[names[0]]
+
+    def report(self, tolerance=None):
+        """
+        Returns one dict per engine: squats counted, CPU seconds, microseconds per sample, and squats
+        matched with the first engine and the share of agreement. Squats match if they are within
+        `tolerance` seconds (by default the first engine's min_peak_interval: engines may time the same
+        rep at different humps of its peak).
+
+        """
+        first = next(iter(self.detectors))
+        reference = self.squat_times[first]
+        if tolerance is None:
+            tolerance = self.detectors[first].min_peak_interval
+        rows = []
+        for name in self.detectors:
+            squat_times = self.squat_times[name]
+            matched = count_matches(reference, squat_times, tolerance)
+            rows.append({
+                'engine': name,
+                'squats': len(squat_times),
+                'cpu_seconds': round(self.cpu_time[name], 4),
+                'us_per_sample': round(self.cpu_time[name] / max(self.samples, 1) * 1e6, 2),
+                'matched': matched,
+                'agreement': round(matched / max(len(reference), len(squat_times)), 3) if reference or squat_times else 1.0,
+            })
+        return rows
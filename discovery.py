@@ -0,0 +1,82 @@
+"""
+Finds Phyphox remote-access servers on the local network.
+
+Every address in the subnet is probed concurrently with a short timeout, and only hosts that answer a
+Phyphox `/get?` request with a JSON buffer are reported, so a whole /24 is scanned in about a second.
+
+Usage:
+    python discovery.py                     # scan the /24 of this machine
+    python discovery.py 127.0.0.0/29        # e.g. emulators started on loopback addresses
+
+"""
+
+import argparse
+import http.client
+import ipaddress
+import json
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+phyphox_port = 8080
+probe_timeout = 0.25    # Seconds to wait for each host
+max_workers = 128       # Hosts probed at the same time
+
+def probe(host, port=phyphox_port, timeout=probe_timeout):
+    """
+    Returns True if a Phyphox server answers on host:port.
+
+    """
+    conn = http.client.HTTPConnection(str(host), port, timeout=timeout)
+    try:
+        conn.request('GET', '/get?')
+        response = conn.getresponse()
+        if response.status != 200:
+            return False
+        data = json.loads(response.read())
+        return isinstance(data, dict) and 'buffer' in data
+    except (OSError, ValueError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+def local_network(prefix=24):
+    """
+    Returns the network this machine is on (as seen by the default route), e.g. 192.168.0.0/24.
+
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            # No packet is sent; connecting a UDP socket just picks the outgoing interface
+            s.connect(('8.8.8.8', 80))
+            address = s.getsockname()[0]
+        except OSError:
+            address = '127.0.0.1'
+    return ipaddress.ip_network(f"{address}/{prefix}", strict=False)
+
+def discover(network=None, port=phyphox_port, timeout=probe_timeout, workers=max_workers):
+    """
+    Probes every host of `network` (the local /24 by default) and returns the addresses of
+    responsive Phyphox servers, in address order.
+
+    """
+    network = local_network() if network is None else ipaddress.ip_network(network, strict=False)
+    hosts = [str(host) for host in network.hosts()] or [str(network.network_address)]
+    with ThreadPoolExecutor(max_workers=min(workers, len(hosts))) as pool:
+        answered = list(pool.map(lambda host: probe(host, port, timeout), hosts))
+    return [host for host, ok in zip(hosts, answered) if ok]
+
+def main():
+    parser = argparse.ArgumentParser(description="Find Phyphox servers on the local network")
+    parser.add_argument('network', nargs='?', help="network to scan, e.g. 192.168.0.0/24 (default: local /24)")
+    parser.add_argument('--port', type=int, default=phyphox_port)
+    parser.add_argument('--timeout', type=float, default=probe_timeout, help="seconds to wait for each host")
+    args = parser.parse_args()
+
+    found = discover(args.network, args.port, args.timeout)
+    for host in found:
+        print(host)
+    if not found:
+        print("No Phyphox servers found")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Downsampling of signals for display.
+
+Plots never need more points than there are pixels, so long signals are reduced before they are drawn.
+Two reductions are available:
+    minmax  keeps the minimum and maximum of every pixel column, so every peak stays visible exactly
+    lttb    Largest-Triangle-Three-Buckets: one point per bucket, picked to keep the visual shape
+            (smoother looking lines, peaks are kept unless two fall into the same bucket)
+
+plot_decimated is a drop-in for ax.plot that picks the point count from the width of the axes.
+
+"""
+
+import numpy as np
+
+def minmax_envelope(x, y, n_bins):
+    """
+    Reduces (x, y) to at most 2 * n_bins points: for each of n_bins equal slices of the signal the
+    minimum and maximum are kept, in that order, at the slice's middle x. Short signals are returned as is.
+
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_bins <= 0 or n <= 2 * n_bins:
+        return x, y
+
+    starts = np.linspace(0, n, n_bins + 1).astype(int)[:-1]
+    mins = np.fmin.reduceat(y, starts)
+    maxs = np.fmax.reduceat(y, starts)
+    middles = x[starts + np.diff(np.append(starts, n)) // 2]
+
+    x_out = np.repeat(middles, 2)
+    y_out = np.empty(2 * n_bins)
+    y_out[0::2] = mins
+    y_out[1::2] = maxs
+    return x_out, y_out
+
+def lttb(x, y, n_out):
+    """
+    Reduces (x, y) to n_out points with the Largest-Triangle-Three-Buckets algorithm. The first and last
+    points are kept; from each bucket in between, the point forming the largest triangle with the point
+    picked from the previous bucket and the average of the next bucket is kept. Short signals are
+    returned as is.
+
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out < 3 or n <= n_out:
+        return x, y
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)    # Buckets between the first and last point
+    # Average of every bucket, used as the third corner of the triangles of the bucket before it
+    avg_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges), x[-1])
+    avg_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / np.diff(edges), y[-1])
+
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        ax_, ay_ = x[picked[b]], y[picked[b]]
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        area = np.abs((ax_ - avg_x[b + 1]) * (y[start:stop] - ay_) - (ax_ - x[start:stop]) * (avg_y[b + 1] - ay_))
+        picked[b + 1] = start + np.argmax(area)
+    return x[picked], y[picked]
+
+def decimate(x, y, n_points, method='minmax'):
+    """
+    Reduces (x, y) to at most about n_points points with the given method ('minmax' or 'lttb').
+
+    """
+    if method == 'lttb':
+        return lttb(x, y, n_points)
+    if method == 'minmax':
+        return minmax_envelope(x, y, n_points // 2)
+    raise ValueError(f"unknown decimation method {method!r}")
+
+def plot_decimated(ax, x, y, *args, method='minmax', **kwargs):
+    """
+    Like ax.plot(x, y, ...), but draws at most about two points per pixel column of the axes. The
+    reduction is done once, so zooming in later shows the reduced line.
+
+    """
+    return ax.plot(*decimate(x, y, 2 * max(int(ax.bbox.width), 1), method), *args, **kwargs)
+
+class StreamingEnvelope:
+    """
+    Builds a min/max envelope of a signal that arrives in blocks of unknown total length, in bounded
+    memory. Each bin starts as one sample; whenever there are more than 2 * max_bins bins, neighbouring
+    bins are merged in pairs, so the resolution halves as the signal grows.
+
+    """
+    def __init__(self, max_bins=2000):
+        self.max_bins = max_bins
+        self.samples_per_bin = 1
+        self.middles = np.empty(0)
+        self.mins = np.empty(0)
+        self.maxs = np.empty(0)
+        self.partial_x = np.empty(0)    # Samples that don't fill a bin yet
+        self.partial_y = np.empty(0)
+
+    def add(self, x, y):
+        x = np.concatenate([self.partial_x, np.asarray(x, dtype=float)])
+        y = np.concatenate([self.partial_y, np.asarray(y, dtype=float)])
+        full = len(y) // self.samples_per_bin * self.samples_per_bin
+        bins = y[:full].reshape(-1, self.samples_per_bin)
+        self.middles = np.append(self.middles, x[self.samples_per_bin // 2:full:self.samples_per_bin])
+        self.mins = np.append(self.mins, np.nanmin(bins, axis=1) if len(bins) else [])
+        self.maxs = np.append(self.maxs, np.nanmax(bins, axis=1) if len(bins) else [])
+        self.partial_x, self.partial_y = x[full:], y[full:]
+
+        while len(self.mins) > 2 * self.max_bins:
+            self.merge_pairs()
+
+    def merge_pairs(self):
+        # An odd last bin is kept as is (it is just finer than the others)
+        even = len(self.mins) // 2 * 2
+        self.middles = np.append(self.middles[:even:2] + (self.middles[1:even:2] - self.middles[:even:2]) / 2,
+                                 self.middles[even:])
+        self.mins = np.append(np.fmin(self.mins[:even:2], self.mins[1:even:2]), self.mins[even:])
+        self.maxs = np.append(np.fmax(self.maxs[:even:2], self.maxs[1:even:2]), self.maxs[even:])
+        self.samples_per_bin *= 2
+
+    def result(self):
+        """
+        Returns the envelope so far as (x, y), the minimum and maximum of each bin in that order at its middle.
+
+        """
+        middles, mins, maxs = self.middles, self.mins, self.maxs
+        if len(self.partial_y):
+            middles = np.append(middles, self.partial_x[len(self.partial_x) // 2])
+            mins = np.append(mins, np.nanmin(self.partial_y))
+            maxs = np.append(maxs, np.nanmax(self.partial_y))
+        y = np.empty(2 * len(mins))
+        y[0::2] = mins
+        y[1::2] = maxs
+        return np.repeat(middles, 2), y
@@ -0,0 +1,159 @@
+"""
+Local event server for mirroring a station's live count on other screens.
+
+Events (rep, target, reset of the count, connection state, ...) are published to an EventHub, which fans them out to every
+subscriber. Each subscriber has its own bounded queue: when a client reads too slowly its oldest events
+are dropped, so publishing never blocks the detection loop no matter how many dashboards are connected.
+
+The server streams events as Server-Sent Events:
+    GET /events     event stream (each message is one JSON event)
+    GET /state      latest event of each kind per station, as JSON
+    GET /           minimal dashboard page
+
+"""
+
+import collections
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+client_queue_size = 100     # Events buffered per client before the oldest are dropped
+keepalive_interval = 15     # Seconds between keep-alive comments on an idle stream
+
+class Subscriber:
+    def __init__(self, queue_size):
+        self.queue = collections.deque(maxlen=queue_size)
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def push(self, message):
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1   # deque drops the oldest message on append
+            self.queue.append(message)
+            self.condition.notify()
+
+    def pop_all(self, timeout):
+        """
+        Waits up to `timeout` seconds for messages and returns all that are queued (possibly none).
+
+        """
+        with self.condition:
+            if not self.queue:
+                self.condition.wait(timeout)
+            messages = list(self.queue)
+            self.queue.clear()
+        return messages
+
+class EventHub:
+    def __init__(self, queue_size=client_queue_size):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.latest = {}    # (station, event) -> (time, last message), replayed to new subscribers
+        self.lock = threading.Lock()
+
+    def publish(self, event, **fields):
+        now = time.time()
+        message = json.dumps(dict(event=event, time=round(now, 3), **fields))
+        with self.lock:
+            self.latest[(fields.get('station'), event)] = (now, message)
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.push(message)
+
+    def subscribe(self):
+        subscriber = Subscriber(self.queue_size)
+        with self.lock:
+            # Replay in the order the events happened, so the client ends up in the current state
+            for _, message in sorted(self.latest.values()):
+                subscriber.push(message)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def state(self):
+        with self.lock:
+            return [json.loads(message) for _, message in sorted(self.latest.values())]
+
+dashboard_page = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Squat-O-Meter</title>
+<style>body{font-family:Helvetica,sans-serif;background:#2b3e50;color:#fff;text-align:center}
+.station{display:inline-block;margin:2em;font-size:2em}.count{font-size:4em}</style></head>
+<body><div id="stations"></div><script>
+const stations = {};
+new EventSource('/events').onmessage = (e) => {
+  const ev = JSON.parse(e.data);
+  if (!ev.station) return;
+  let s = stations[ev.station];
+  if (!s) {
+    s = stations[ev.station] = document.createElement('div');
+    s.className = 'station';
+    s.innerHTML = '<div>' + ev.station + '</div><div class="count">0</div><div class="status"></div>';
+    document.getElementById('stations').appendChild(s);
+  }
+  if (ev.count !== undefined) s.querySelector('.count').textContent = ev.count;
+  if (ev.event === 'target') s.querySelector('.status').textContent = 'Target completed!';
+  if (ev.event === 'rep' || ev.event === 'reset') s.querySelector('.status').textContent = '';
+  if (ev.event === 'connection') s.querySelector('.status').textContent = ev.state === 'lost' ? 'Connection lost!' : '';
+};
+</script></body></html>
+"""
+
+def make_handler(hub):
+    class Handler(BaseHTTPRequestHandler):
+        def send_body(self, content_type, data):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.partition('?')[0]
+            if path == '/':
+                self.send_body('text/html; charset=utf-8', dashboard_page.encode())
+            elif path == '/state':
+                self.send_body('application/json', json.dumps(hub.state()).encode())
+            elif path == '/events':
+                self.stream_events()
+            else:
+                self.send_error(404)
+
+        def stream_events(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            subscriber = hub.subscribe()
+            try:
+                while True:
+                    messages = subscriber.pop_all(keepalive_interval)
+                    if messages:
+                        self.wfile.write(''.join(f"data: {message}\n\n" for message in messages).encode())
+                    else:
+                        self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+            except OSError:
+                pass    # Client went away
+            finally:
+                hub.unsubscribe(subscriber)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def start_event_server(hub, port, host='0.0.0.0'):
+    """
+    Serves `hub` on host:port from a background thread and returns the server (call shutdown() to stop it).
+
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(hub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
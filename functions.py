@@ -1,71 +1,106 @@
-import pandas as pd
 from datetime import datetime
 from tkinter import messagebox
 import ipaddress
+import queue
+import sqlite3
+import threading
+import history
 
-def save_squat_count(squat_count):
-    # Get current date
+# Columns of the CSV files exchanged with database_tool.py (User is optional)
+database_columns = ['Day', 'Month', 'Year', 'Count']
+
+def make_squat_row(squat_count, user=history.default_user):
+    # Stamp the row with the date the set was finished, not the date it gets written
     current_date = datetime.now()
-    day = current_date.day
-    month = current_date.month
-    year = current_date.year
-    
-    # Create a DataFrame
-    data = {'Day': [day],
-            'Month': [month],
-            'Year': [year],
-            'Count': [squat_count]}
-    
-    new_df = pd.DataFrame(data)
-    
-    try:
-        # Try loading existing CSV file
-        existing_df = pd.read_csv('database.csv')
-        
-        # Append new data to existing DataFrame
-        updated_df = pd.concat([existing_df, new_df], ignore_index=True)
-    except FileNotFoundError:
-        # If the file doesn't exist, use the new DataFrame
-        updated_df = new_df
-    
-    # Save updated DataFrame to CSV
-    updated_df.to_csv('database.csv', index=False)
+    return {'user': user,
+            'day': current_date.day,
+            'month': current_date.month,
+            'year': current_date.year,
+            'session': int(current_date.timestamp()),
+            'count': squat_count}
+
+def make_rep_rows(squat_row, reps):
+    # Per-rep metrics (see rep_metrics.py), tagged with the set they belong to
+    return [dict({key: squat_row[key] for key in ('user', 'year', 'month', 'day', 'session')},
+                 rep=rep['rep'], interval=rep['interval'], descent=rep['descent'], ascent=rep['ascent'],
+                 peak_acc=rep['peak_acc'], depth=rep['depth']) for rep in reps]
+
+def save_squat_count(squat_count, reps=(), user=history.default_user):
+    row = make_squat_row(squat_count, user)
+    history.add_sets([row], make_rep_rows(row, reps))
+
+# Queue of (row, rep rows, callback) tuples waiting to be written by the background writer
+save_queue = queue.Queue()
 
+def save_worker():
+    while True:
+        item = save_queue.get()
+        if item is None:
+            save_queue.task_done()
+            break
+        batch = [item]
+        # Drain whatever else queued up meanwhile so it goes out in the same write
+        while True:
+            try:
+                next_item = save_queue.get_nowait()
+            except queue.Empty:
+                break
+            if next_item is None:
+                save_queue.put(None)    # Handle the stop request after this batch
+                save_queue.task_done()
+                break
+            batch.append(next_item)
+        error = None
+        try:
+            # The whole batch is one transaction
+            history.add_sets([row for row, _, _ in batch], [rep_row for _, rep_rows, _ in batch for rep_row in rep_rows])
+        except (OSError, sqlite3.Error) as e:
+            error = e
+            print(f"Error: Could not write to {history.history_file}: {e}")
+        for row, _, callback in batch:
+            if callback is not None:
+                # Callbacks run on the writer thread, so UI code must hand the result over to the Tk thread
+                callback(row['count'], error)
+            save_queue.task_done()
 
-def get_squat_sum_month(month, year):
+# Start the background writer so saves never block the Tk main thread
+threading.Thread(target=save_worker, daemon=True).start()
+
+def save_squat_count_async(squat_count, callback=None, reps=(), user=history.default_user):
     """
-    This function reads the squat count data from a CSV file and returns the sum of squat counts for a given month and year.
+    Queues a user's squat count, and optionally the metrics of its reps, for the background writer.
+    `callback(count, error)` is called once the row has been written (error is None) or the write failed.
 
     """
-    # Read CSV file
-    try:
-        df = pd.read_csv('database.csv')
-    except FileNotFoundError:
-        print("Error: database.csv file not found.")
-        return None
+    row = make_squat_row(squat_count, user)
+    save_queue.put((row, make_rep_rows(row, reps), callback))
 
-    # Filter DataFrame based on month and year
-    filtered_df = df[(df['Month'] == month) & (df['Year'] == year)]
+def flush_saves():
+    # Block until every queued save has been written (used on shutdown)
+    save_queue.join()
 
-    # Calculate sum of squat counts
-    squat_count_sum = filtered_df['Count'].sum()
 
-    return squat_count_sum
+def get_squat_sum_month(month, year, user=history.default_user):
+    """
+    This function returns the sum of a user's squat counts for a given month and year (an indexed lookup).
+
+    """
+    return history.monthly_total(user, year, month)
 
-def confirm_save(squats_count):
-    answer = messagebox.askokcancel("Confirmation", "Are you sure you want to save?")
+def confirm_save(squats_count, callback=None, reps=(), user=history.default_user):
+    answer = messagebox.askokcancel("Confirmation", f"Are you sure you want to save for {user}?")
     if answer:
-        # If the user clicks OK, save to database
-        print("Saved to database")
-        save_squat_count(squats_count)
-        messagebox.showinfo("Save Successful", f"{squats_count} squats saved successfully!")
+        # If the user clicks OK, hand the count to the background writer
+        print("Queued for saving to database")
+        save_squat_count_async(squats_count, callback, reps, user)
     else:
         # If the user clicks Cancel, don't save
         print("User clicked Cancel, data not saved")
+    return answer
 
 def is_valid_ip(address):
     try:
         ipaddress.IPv4Address(address)  # Check if it's a valid IPv4 address
         return True
     except ipaddress.AddressValueError:
-        return False
\ No newline at end of file
+        return False
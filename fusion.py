@@ -0,0 +1,93 @@
+"""
+Orientation-robust vertical acceleration from several sensor channels.
+
+The z channel alone only measures vertical motion while the phone is held flat. Here the direction of
+gravity is tracked with a low-pass filter over the full acceleration vector, and each sample is projected
+onto it, so the signal stays vertical however the phone is held (at rest it reads about 9.81 m/s^2, like
+accZ, and the same thresholds apply). When a gyroscope or magnetometer is available, samples taken while
+the phone is rotating quickly (arm swings, turning it over) are held at the gravity level, so they cannot
+produce peaks.
+
+All steps work on blocks of samples at once, and the filter state carries over between calls. The
+filter follows the phone's sample rate, which update_buffers measures from the sample times.
+
+"""
+
+import numpy as np
+from scipy.signal import lfilter
+
+# Buffers fetched for fusion, in one request; channels the experiment lacks come back empty
+acc_buffers = ['accX', 'accY', 'accZ']
+gyro_buffers = ['gyrX', 'gyrY', 'gyrZ']
+mag_buffers = ['magX', 'magY', 'magZ']
+fusion_buffers = acc_buffers + gyro_buffers + mag_buffers
+
+gravity_time = 1.0      # Time constant of the gravity direction filter (seconds)
+rotation_limit = 2.0    # Rotation rate (rad/s) above which samples are treated as swings
+
+class VerticalFusion:
+    def __init__(self, sample_rate=50.0):
+        self.filter_state = None    # lfilter state per axis
+        self.last_mag = None        # Last unit magnetometer vector, to estimate rotation without a gyro
+        self.set_sample_rate(sample_rate)
+
+    def set_sample_rate(self, sample_rate):
+        self.alpha = 1 - np.exp(-1 / (sample_rate * gravity_time))
+        self.sample_period = 1 / sample_rate
+
+    def update(self, acc, gyro=None, mag=None):
+        """
+        Takes an (n, 3) block of acceleration samples (a single (3,) sample also works), with optional
+        matching gyroscope (rad/s) and magnetometer blocks, and returns the n vertical accelerations.
+
+        """
+        acc = np.atleast_2d(np.asarray(acc, dtype=float))
+        if self.filter_state is None:
+            # Start the filter at rest on the first sample
+            self.filter_state = acc[0][np.newaxis, :] * (1 - self.alpha)
+        gravity, self.filter_state = lfilter([self.alpha], [1, self.alpha - 1], acc, axis=0, zi=self.filter_state)
+
+        unit_gravity = gravity / np.linalg.norm(gravity, axis=1, keepdims=True)
+        vertical = np.einsum('ij,ij->i', acc, unit_gravity)
+
+        rotation = self.rotation_rate(gyro, mag, len(acc))
+        if rotation is not None:
+            swinging = rotation > rotation_limit
+            vertical[swinging] = np.linalg.norm(gravity[swinging], axis=1)
+        return vertical
+
+    def rotation_rate(self, gyro, mag, n):
+        if gyro is not None:
+            return np.linalg.norm(np.atleast_2d(np.asarray(gyro, dtype=float)), axis=1)
+        if mag is None:
+            return None
+
+        # Angle between consecutive magnetic field directions, per second
+        mag = np.atleast_2d(np.asarray(mag, dtype=float))
+        unit_mag = mag / np.linalg.norm(mag, axis=1, keepdims=True)
+        previous = np.vstack([unit_mag[:1] if self.last_mag is None else self.last_mag, unit_mag[:-1]])
+        self.last_mag = unit_mag[-1:]
+        cosines = np.clip(np.einsum('ij,ij->i', unit_mag, previous), -1.0, 1.0)
+        return np.arccos(cosines) / self.sample_period
+
+    def update_buffers(self, times, buffers):
+        """
+        Takes the times and buffers of a block fetched with phyphox.BufferStream.fetch_all (fusion_buffers
+        along) and returns the vertical accelerations. The gyroscope and magnetometer are only used when
+        all three of their axes came along.
+
+        """
+        if len(times) == 0:
+            return np.array([])
+        if len(times) > 1 and times[-1] > times[0]:
+            self.set_sample_rate((len(times) - 1) / (times[-1] - times[0]))
+        return self.update(self.channels(buffers, acc_buffers, len(times)),
+                           gyro=self.channels(buffers, gyro_buffers, len(times)),
+                           mag=self.channels(buffers, mag_buffers, len(times)))
+
+    @staticmethod
+    def channels(buffers, names, n):
+        # The (n, 3) block of a sensor, or None if any of its axes is missing
+        if any(len(buffers.get(name, ())) != n for name in names):
+            return None
+        return np.column_stack([buffers[name] for name in names])
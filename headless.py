@@ -0,0 +1,160 @@
+"""
+Headless squat counter.
+
+Runs the counting pipeline (see pipeline.py) without Tk, matplotlib or ttkbootstrap and writes one JSON object per line
+to stdout for every event, so it can run on kiosks and servers or be driven by automated tests.
+
+Usage:
+    python headless.py 192.168.0.101
+    python headless.py 127.0.0.2 127.0.0.3 --target 10 --signal abs
+    python headless.py --bus squat-o-meter      (samples shared by sample_bus.py serve)
+
+Events:
+    {"event": "start", "stations": [...], ...}
+    {"event": "connection", "station": "192.168.0.101", "state": "ok" | "lost", ...}
+    {"event": "rep", "station": "192.168.0.101", "count": 3, "interval": 2.1, "descent": 1.2, "peak_acc": 14.3, "depth": 0.45, ...}
+    {"event": "target", "station": "192.168.0.101", "count": 10, "target": 10, ...}
+    {"event": "reset", "station": "192.168.0.101", "count": 10, "target": 10, ...}   (the next rep starts a new set)
+    {"event": "ignored", "station": "192.168.0.101", "label": "lunge", "reps": 1, ...}   (with --classify)
+    {"event": "movements", "station": "192.168.0.101", "windows": {"squat": 310, "rest": 42, ...}}
+    {"event": "engines", "station": "192.168.0.101", "engines": [{"engine": "peaks", "squats": 12, "us_per_sample": 7.1, ...}, ...]}
+    {"event": "window", "station": "192.168.0.101", "window": 7.5, "buffer_size": 375, "scanned_share": 0.17, "us_per_sample": 6.4, ...}   (--engine adaptive)
+    {"event": "samples", "station": "192.168.0.101", "received": 41230, "duplicates": 0, "gaps": 1, ...}
+    {"event": "stop", ...}
+
+With --serve PORT the same events are also streamed to dashboards (see event_server.py).
+
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import phyphox
+from detector import engines, EngineComparison, detector_from_args, add_arguments as add_detector_arguments
+from pipeline import PhoneSource, CountingPipeline
+from event_server import EventHub, start_event_server
+from sample_bus import BusReader
+from classifier import MovementClassifier
+
+output_lock = threading.Lock()
+event_hub = None    # Set when events are also served to dashboards
+
+def emit(event, **fields):
+    # One line per event, flushed right away so consumers see it immediately
+    line = json.dumps(dict(event=event, time=round(time.time(), 3), **fields))
+    with output_lock:
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+    if event_hub is not None:
+        event_hub.publish(event, **fields)
+
+def run_station(ip_address, args, stop_event, reader=None):
+    # With a bus reader the samples come from the bus (already resampled) instead of the phone
+    if reader is None:
+        source = PhoneSource(phyphox.make_url(ip_address, args.port), args.signal, control=not args.no_control,
+                             max_buffer=args.max_buffer)
+        if args.classify:
+            # Only squats are counted; x, y and z are fetched along for the classifier
+            source.set_classifier(MovementClassifier())
+    else:
+        source = reader
+    detector = detector_from_args(args, args.engine)
+    if args.compare:
+        # The chosen engine counts; the others run on the same samples for the report at the end
+        detector = EngineComparison({engine: detector_from_args(args, engine)
+                                     for engine in [args.engine] + [name for name in engines if name != args.engine]})
+    pipeline = CountingPipeline(source, detector, args.rate, args.target)
+
+    while not stop_event.is_set():
+        tick_start = time.monotonic()
+        events, (times, values) = pipeline.tick()
+        for event, fields in events:
+            emit(event, station=ip_address, **fields)
+
+        if reader is not None and reader.closed and not len(times):
+            emit('connection', station=ip_address, state='lost', error="the sample bus was closed")
+            break
+        # Keep a steady poll rate regardless of how long the request took
+        stop_event.wait(max(0.0, args.poll - (time.monotonic() - tick_start)))
+
+    if pipeline.classifier is not None:
+        emit('movements', station=ip_address, windows=dict(pipeline.classifier.counts))
+    if args.compare:
+        emit('engines', station=ip_address, engines=detector.report())
+    elif getattr(detector, 'adaptive', False):
+        emit('window', station=ip_address, **detector.window_stats())
+    if reader is not None:
+        emit('samples', station=ip_address, received=reader.received, lost=reader.lost)
+        reader.close()
+    else:
+        source.close()
+        emit('samples', station=ip_address, clears=source.experiment.clears if source.experiment is not None else 0,
+             **pipeline.resampler.stats())
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Count squats without a GUI and print events as JSON lines")
+    parser.add_argument('stations', nargs='*', help="IP address(es) of the Phyphox server(s)")
+    parser.add_argument('--bus', help="read the samples from this sample bus (see sample_bus.py) instead of a phone")
+    parser.add_argument('--port', type=int, default=phyphox.phyphox_port)
+    parser.add_argument('--signal', choices=['z', 'abs', 'fused'], default='z',
+                        help="acceleration in z direction (default), absolute acceleration or fused vertical acceleration")
+    parser.add_argument('--engine', choices=list(engines), default='peaks', help="detection engine (see detector.py)")
+    parser.add_argument('--compare', action='store_true',
+                        help="also run the other engines and report their CPU cost and agreement at the end")
+    parser.add_argument('--classify', action='store_true',
+                        help="count squats only: recognize lunges, jumps and other movements and ignore their reps")
+    add_detector_arguments(parser)
+    parser.add_argument('--target', type=int, default=0, help="target squats per set (0: no target)")
+    parser.add_argument('--poll', type=float, default=0.1, help="seconds between requests to the phone")
+    parser.add_argument('--rate', type=float, default=50, help="samples per second the signal is resampled to")
+    parser.add_argument('--no-control', action='store_true', help="don't start, stop or clear the phone's experiment")
+    parser.add_argument('--max-buffer', type=float, default=300,
+                        help="clear the phone's buffers when they hold more than this many seconds of samples")
+    parser.add_argument('--serve', type=int, default=0, metavar='PORT', help="also stream events to dashboards on this port")
+    parser.add_argument('--bind', default='0.0.0.0', help="address the event server listens on")
+    parser.add_argument('--duration', type=float, default=0, help="stop after this many seconds (0: run until interrupted)")
+    args = parser.parse_args(argv)
+    if bool(args.stations) == bool(args.bus):
+        parser.error("give either the station address(es) or --bus")
+    if args.classify and (args.bus or args.signal == 'fused'):
+        # The classifier needs the phone's raw x/y/z samples
+        parser.error("--classify needs a phone's z or abs signal, not --bus or --signal fused")
+    return args
+
+def main(argv=None):
+    global event_hub
+    args = parse_args(argv)
+    if args.serve:
+        event_hub = EventHub()
+        start_event_server(event_hub, args.serve, args.bind)
+        print(f"Serving live events on http://{args.bind}:{args.serve}/", file=sys.stderr)
+    stop_event = threading.Event()
+    if args.bus:
+        try:
+            reader = BusReader(args.bus)
+        except FileNotFoundError:
+            sys.exit(f"No sample bus named '{args.bus}' (start it with: python sample_bus.py serve ADDRESS)")
+        # The bus decides the signal and its rate
+        args.stations, args.signal, args.rate = [args.bus], reader.signal, reader.rate
+        threads = [threading.Thread(target=run_station, args=(args.bus, args, stop_event, reader), daemon=True)]
+    else:
+        threads = [threading.Thread(target=run_station, args=(station, args, stop_event), daemon=True)
+                   for station in args.stations]
+
+    emit('start', stations=args.stations, signal=args.signal, height=args.height, distance=args.distance,
+         window=args.window, interval=args.interval, rate=args.rate, target=args.target, engine=args.engine)
+    for thread in threads:
+        thread.start()
+    try:
+        stop_event.wait(args.duration or None)
+    except KeyboardInterrupt:
+        pass
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    emit('stop')
+
+if __name__ == '__main__':
+    main()
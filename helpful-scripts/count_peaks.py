@@ -4,10 +4,16 @@ The script reads a CSV file containing acceleration data and identifies the peak
 The CSV file is generated from the Phyphox app, which records acceleration data from a smartphone's accelerometer.
 """
 
+import os
+import sys
 import pandas as pd
 import pylab as plt
 import numpy as np
 from scipy.signal import find_peaks
+
+# downsample.py lives in the project folder, one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from downsample import plot_decimated
  
 df = pd.read_csv('4_squats.csv')
 
@@ -27,7 +33,7 @@ df = df.rename(columns=new_column_names)
 peaks, _ = find_peaks(df['z'], height=12.0, distance=1000) 
 
 # Plot the signal and the identified peaks
-plt.plot(df.index, df['z'])
+plot_decimated(plt.gca(), df.index, df['z'])
 plt.plot(df.index[peaks], df['z'][peaks], "x")
 plt.xlabel('Index')
 plt.ylabel('Amplitude')
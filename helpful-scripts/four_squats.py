@@ -1,12 +1,19 @@
 """
 This script reads the data from the 4_squats.csv file and plots the x, y, and z acceleration values on the same graph.
 The data is collected from the Phyphox app, which records acceleration data from a smartphone's accelerometer.
+Long recordings are reduced to about two points per pixel column before plotting (see downsample.py).
 This script helps visualize the acceleration values over time.
 
 """
 
+import os
+import sys
 import pandas as pd
 import pylab as plt
+
+# downsample.py lives in the project folder, one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from downsample import plot_decimated
  
 df = pd.read_csv('4_squats.csv')
 
@@ -29,9 +36,10 @@ print(df.head())
 
 # plot the x,y,z acceleration values on the same graph
 plt.figure(figsize=(8, 8))
-plt.plot(df['t'], df['x'], label='x')
-plt.plot(df['t'], df['y'], label='y')
-plt.plot(df['t'], df['z'], label='z')
+ax = plt.gca()
+plot_decimated(ax, df['t'], df['x'], label='x')
+plot_decimated(ax, df['t'], df['y'], label='y')
+plot_decimated(ax, df['t'], df['z'], label='z')
 plt.legend()
 plt.title('Acceleration values')
 plt.xlabel('Time (s)')
@@ -0,0 +1,155 @@
+"""
+This script emulates the Phyphox remote-access server by replaying a recorded CSV export in real time.
+It answers the same `/get?` requests as the "Acceleration with g" experiment (accX, accY, accZ, acc and acc_time),
+so the app and the other scripts can be tried without a phone. The recording is looped forever.
+
+Several emulators can run side by side on loopback addresses, e.g. to try out the network discovery:
+
+    python phyphox_emulator.py --host 127.0.0.2
+    python phyphox_emulator.py --host 127.0.0.3 --csv 0_squat.csv
+    python ../discovery.py 127.0.0.0/29
+
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+import numpy as np
+import pandas as pd
+
+# Map the Phyphox CSV columns to the buffer names used by the remote-access interface
+buffer_columns = {
+    'acc_time': 'Time (s)',
+    'accX': 'Acceleration x (m/s^2)',
+    'accY': 'Acceleration y (m/s^2)',
+    'accZ': 'Acceleration z (m/s^2)',
+    'acc': 'Absolute acceleration (m/s^2)'
+}
+
+class Recording:
+    """
+    A looped recording together with the emulated experiment state (measuring, cleared, ...).
+
+    """
+    def __init__(self, path):
+        df = pd.read_csv(path)
+        self.buffers = {name: df[column].to_numpy(dtype=float) for name, column in buffer_columns.items()}
+        t = self.buffers['acc_time']
+        self.rec_t = t - t[0]
+        self.duration = self.rec_t[-1] + np.median(np.diff(t))
+        self.lock = threading.Lock()
+        self.session = os.urandom(4).hex()
+        self.measuring = True
+        self.elapsed = 0.0                  # Experiment time accumulated before the last start
+        self.started = time.monotonic()
+
+    def now(self):
+        # Experiment time in seconds; frozen while stopped
+        if self.measuring:
+            return self.elapsed + time.monotonic() - self.started
+        return self.elapsed
+
+    def count(self, t):
+        # Number of replayed samples with time <= t
+        if t < 0:
+            return 0
+        loops = int(t // self.duration)
+        return loops * len(self.rec_t) + int(np.searchsorted(self.rec_t, t - loops * self.duration, side='right'))
+
+    def values(self, name, first, last):
+        # Values of buffer `name` for replayed samples first..last-1
+        k = np.arange(first, last)
+        if name == 'acc_time':
+            return (k // len(self.rec_t)) * self.duration + self.rec_t[k % len(self.rec_t)]
+        return self.buffers[name][k % len(self.rec_t)]
+
+    def control(self, cmd):
+        with self.lock:
+            if cmd == 'start' and not self.measuring:
+                self.measuring = True
+                self.started = time.monotonic()
+            elif cmd == 'stop' and self.measuring:
+                self.elapsed = self.now()
+                self.measuring = False
+            elif cmd == 'clear':
+                self.elapsed = 0.0
+                self.started = time.monotonic()
+            else:
+                return cmd in ('start', 'stop')
+        return True
+
+    def get(self, query):
+        """
+        Answers a `/get?` query. Each part is `name` (latest value), `name=full` (whole buffer),
+        `name=threshold` (values after a threshold) or `name=threshold|timebuffer`.
+
+        """
+        with self.lock:
+            available = self.count(self.now())
+            result = {}
+            for part in filter(None, query.split('&')):
+                name, _, arg = unquote(part).partition('=')
+                if name not in self.buffers:
+                    continue
+                if arg == '':
+                    first, mode = max(available - 1, 0), 'single'
+                elif arg == 'full':
+                    first, mode = 0, 'full'
+                else:
+                    threshold, _, _ = arg.partition('|')
+                    try:
+                        first, mode = self.count(float(threshold)), 'partial'
+                    except ValueError:
+                        first, mode = 0, 'full'
+                values = self.values(name, first, available).tolist()
+                if mode == 'single' and not values:
+                    values = [None]
+                result[name] = {'size': 0, 'updateMode': mode, 'buffer': values}
+            status = {'session': self.session, 'measuring': self.measuring, 'timedRun': False, 'countDown': 0}
+        return {'buffer': result, 'status': status}
+
+def make_handler(recording):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, query = self.path.partition('?')
+            if path == '/get':
+                body = recording.get(query)
+            elif path == '/control':
+                cmd = query.partition('cmd=')[2].partition('&')[0]
+                body = {'result': recording.control(cmd)}
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass    # Keep the console quiet; the app polls several times a second
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a Phyphox CSV export as a Phyphox remote-access server")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (any 127.x.y.z works on Linux)")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--csv', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '4_squats.csv'),
+                        help="Phyphox 'Acceleration with g' export to replay")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(Recording(args.csv)))
+    print(f"Replaying {args.csv} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Squat history of every user, stored in an SQLite database.
+
+Sets and rep metrics are indexed by user and date, so a user's monthly report only reads that user's
+rows for the month, and the monthly leaderboard is computed from an index that covers (year, month,
+user, count) without touching the table itself, however many members a station has.
+
+The history used to be kept in database.csv and reps.csv, without users; on first use those files are
+imported for the user "default". Malformed rows are skipped, and the import is only marked as done
+(PRAGMA user_version) in the transaction that commits it, so a failed import is retried on the next start.
+
+"""
+
+import contextlib
+import csv
+import os
+import sqlite3
+import threading
+import time
+
+history_file = 'history.db'
+default_user = 'default'
+
+# Legacy CSV files imported on first use
+legacy_database_file = 'database.csv'
+legacy_reps_file = 'reps.csv'
+
+schema = """
+CREATE TABLE IF NOT EXISTS users (name TEXT PRIMARY KEY, created INTEGER);
+CREATE TABLE IF NOT EXISTS sets (
+    user TEXT NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL, day INTEGER NOT NULL,
+    session INTEGER, count INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS reps (
+    user TEXT NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL, day INTEGER NOT NULL,
+    session INTEGER, rep INTEGER, interval REAL, descent REAL, ascent REAL, peak_acc REAL, depth REAL);
+CREATE INDEX IF NOT EXISTS sets_by_user_date ON sets (user, year, month, day);
+CREATE INDEX IF NOT EXISTS sets_by_month ON sets (year, month, user, count);
+CREATE INDEX IF NOT EXISTS reps_by_user_date ON reps (user, year, month, day);
+"""
+
+set_columns = ['user', 'year', 'month', 'day', 'session', 'count']
+rep_columns = ['user', 'year', 'month', 'day', 'session', 'rep', 'interval', 'descent', 'ascent', 'peak_acc', 'depth']
+
+setup_lock = threading.Lock()
+setup_done = False
+schema_version = 1      # user_version of a database whose legacy CSV import is committed
+
+def connect():
+    """
+    Opens a connection to the history database, creating (and migrating) it on first use. Connections
+    can't be shared between threads, so each thread opens its own.
+
+    """
+    global setup_done
+    with setup_lock:
+        if not setup_done:
+            connection = sqlite3.connect(history_file, timeout=10)
+            try:
+                # Write-ahead logging lets reports read while the writer thread saves
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.executescript(schema)
+                version, = connection.execute('PRAGMA user_version').fetchone()
+                # Databases from before the version mark have the default user once their import committed
+                if version < schema_version and not connection.execute('SELECT 1 FROM users LIMIT 1').fetchone():
+                    import_legacy_csv(connection)
+                elif version < schema_version:
+                    connection.execute(f'PRAGMA user_version = {schema_version}')
+            finally:
+                connection.close()
+            setup_done = True
+    return sqlite3.connect(history_file, timeout=10)
+
+@contextlib.contextmanager
+def transaction():
+    # A connection for one unit of work: committed if it succeeds, rolled back if not, then closed
+    connection = connect()
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+def parse_int(text):
+    # Counts were sometimes written as floats ("10.0")
+    value = float(text)
+    if not value.is_integer():
+        raise ValueError(f"not a whole number: {text}")
+    return int(value)
+
+def parse_optional(text):
+    return float(text) if text not in (None, '') else None
+
+def legacy_rows(path, parse_row):
+    """
+    Yields parse_row(row) for the rows of a legacy CSV file, skipping (and counting) those that don't parse.
+
+    """
+    skipped = 0
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                yield parse_row(row)
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+    if skipped:
+        print(f"Skipped {skipped} malformed row(s) of {path}")
+
+def import_legacy_csv(connection):
+    # database.csv and reps.csv had no user column; their rows become the default user's history.
+    # Everything, including the version mark, is committed together or not at all
+    with connection:
+        if os.path.exists(legacy_database_file):
+            connection.executemany(
+                'INSERT INTO sets (user, year, month, day, session, count) VALUES (?, ?, ?, ?, NULL, ?)',
+                legacy_rows(legacy_database_file, lambda row: (
+                    default_user, parse_int(row['Year']), parse_int(row['Month']), parse_int(row['Day']),
+                    parse_int(row['Count']))))
+        if os.path.exists(legacy_reps_file):
+            connection.executemany(
+                'INSERT INTO reps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                legacy_rows(legacy_reps_file, lambda row: (
+                    default_user, parse_int(row['Year']), parse_int(row['Month']), parse_int(row['Day']),
+                    parse_int(row['Session']), parse_int(row['Rep']),
+                    *(parse_optional(row[column]) for column in ('Interval', 'Descent', 'Ascent', 'PeakAcc', 'Depth')))))
+        connection.execute('INSERT OR IGNORE INTO users VALUES (?, ?)', (default_user, int(time.time())))
+        connection.execute(f'PRAGMA user_version = {schema_version}')
+
+def add_user(name):
+    with transaction() as connection:
+        connection.execute('INSERT OR IGNORE INTO users VALUES (?, ?)', (name, int(time.time())))
+
+def users():
+    with transaction() as connection:
+        return [name for name, in connection.execute('SELECT name FROM users ORDER BY name')]
+
+def add_sets(sets, reps=()):
+    """
+    Writes set rows (dicts with the keys of set_columns) and rep rows (rep_columns) in one transaction.
+
+    """
+    with transaction() as connection:
+        connection.executemany(
+            'INSERT OR IGNORE INTO users VALUES (?, ?)', {(row['user'], int(time.time())) for row in sets})
+        connection.executemany(
+            f"INSERT INTO sets ({', '.join(set_columns)}) VALUES ({', '.join('?' * len(set_columns))})",
+            ([row[column] for column in set_columns] for row in sets))
+        connection.executemany(
+            f"INSERT INTO reps ({', '.join(rep_columns)}) VALUES ({', '.join('?' * len(rep_columns))})",
+            ([row[column] for column in rep_columns] for row in reps))
+
+def daily_counts(user, year, month):
+    """
+    Returns {day: squats} for a user's month.
+
+    """
+    with transaction() as connection:
+        return dict(connection.execute(
+            'SELECT day, SUM(count) FROM sets WHERE user = ? AND year = ? AND month = ? GROUP BY day',
+            (user, year, month)))
+
+def monthly_total(user, year, month):
+    with transaction() as connection:
+        total, = connection.execute(
+            'SELECT SUM(count) FROM sets WHERE user = ? AND year = ? AND month = ?', (user, year, month)).fetchone()
+    return total or 0
+
+def month_reps(user, year, month):
+    """
+    Returns the rep metrics of a user's month as a list of dicts (keys of rep_columns).
+
+    """
+    with transaction() as connection:
+        rows = connection.execute(
+            f"SELECT {', '.join(rep_columns)} FROM reps WHERE user = ? AND year = ? AND month = ?", (user, year, month))
+        return [dict(zip(rep_columns, row)) for row in rows]
+
+def leaderboard(year, month, limit=10):
+    """
+    Returns the top `limit` users of a month as a list of (user, squats), best first.
+
+    """
+    with transaction() as connection:
+        return connection.execute(
+            'SELECT user, SUM(count) AS total FROM sets WHERE year = ? AND month = ? '
+            'GROUP BY user ORDER BY total DESC, user LIMIT ?', (year, month, limit)).fetchall()
+
+def rank(user, year, month):
+    """
+    Returns (rank, number of ranked users) of a user in a month; rank is None without squats that month.
+
+    """
+    total = monthly_total(user, year, month)
+    with transaction() as connection:
+        better, members = connection.execute(
+            'SELECT SUM(total > ?), COUNT(*) FROM '
+            '(SELECT SUM(count) AS total FROM sets WHERE year = ? AND month = ? GROUP BY user)',
+            (total, year, month)).fetchone()
+    return ((better or 0) + 1 if total else None), members
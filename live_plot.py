@@ -0,0 +1,81 @@
+"""
+Live signal-plus-peaks panel for the Count Squats tab.
+
+The axes, labels and threshold line are drawn once and cached as a background image; each frame only
+the signal and peak markers are redrawn on top of it (blitting). Frames are capped at `max_fps` and the
+signal is reduced to a min/max envelope of about one point per pixel column, so drawing stays cheap
+no matter how large the moving window is.
+
+"""
+
+import time
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from downsample import minmax_envelope
+
+class LivePlot:
+    def __init__(self, master, window_size, threshold, max_fps=15, y_limits=(5, 20)):
+        self.max_fps = max_fps
+        self.last_draw = 0.0
+        self.window_size = window_size
+
+        self.fig = Figure(figsize=(7.6, 1.7), dpi=100)
+        self.ax = self.fig.add_subplot()
+        self.ax.set_xlim(0, window_size)
+        self.ax.set_ylim(*y_limits)
+        self.ax.set_ylabel('m/s²', fontsize=8)
+        self.ax.tick_params(labelsize=7)
+        self.fig.subplots_adjust(left=0.08, right=0.99, top=0.95, bottom=0.15)
+
+        # Animated artists are left out of normal draws and only painted by blitting
+        self.threshold_line = self.ax.axhline(threshold, color='tab:red', linewidth=0.8, linestyle='--')
+        self.line, = self.ax.plot([], [], linewidth=1, animated=True)
+        self.peaks_line, = self.ax.plot([], [], 'x', color='tab:orange', animated=True)
+
+        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+        self.background = None
+        # Every full draw (first show, resize, new limits) refreshes the cached background
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.get_tk_widget().pack(side='top', fill='both', expand=True)
+        self.canvas.draw()
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+
+    def set_static(self, window_size, threshold):
+        # Changing the limits or threshold invalidates the background, so do a full redraw
+        if window_size != self.window_size or threshold != self.threshold_line.get_ydata()[0]:
+            self.window_size = window_size
+            self.ax.set_xlim(0, window_size)
+            self.threshold_line.set_ydata([threshold, threshold])
+            self.canvas.draw()
+
+    def update(self, samples, peaks, window_size, threshold):
+        """
+        Shows the current moving window and its peaks. Calls faster than `max_fps` are skipped.
+
+        """
+        now = time.perf_counter()
+        if now - self.last_draw < 1 / self.max_fps:
+            return
+        self.last_draw = now
+
+        self.set_static(window_size, threshold)
+        if self.background is None:
+            return
+
+        y = np.asarray(samples, dtype=float)
+        x = np.arange(len(y))
+        width_px = int(self.ax.bbox.width)
+        self.line.set_data(*minmax_envelope(x, y, width_px // 2))
+        peaks = np.asarray(peaks, dtype=int)
+        self.peaks_line.set_data(peaks, y[peaks])
+
+        self.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.line)
+        self.ax.draw_artist(self.peaks_line)
+        self.canvas.blit(self.ax.bbox)
+
+    def destroy(self):
+        self.canvas.get_tk_widget().destroy()
@@ -1,103 +1,148 @@
+import time
+startup_marks = [('start', time.perf_counter())]   # (label, time) pairs for the startup report
+
+import argparse
+from detector import add_arguments as add_detector_arguments
+parser = argparse.ArgumentParser(description="Squat-O-Meter")
+parser.add_argument('--events-port', type=int, default=0, metavar='PORT',
+                    help="stream live rep/target/connection events to dashboards on this port (0: off)")
+parser.add_argument('--no-remote-control', action='store_true',
+                    help="don't start, stop or clear the phone's experiment (see phyphox.ExperimentControl)")
+# The app sets the thresholds with its sliders; numpy and scipy are only loaded with the first detector
+add_detector_arguments(parser, thresholds=False)
+args = parser.parse_args()
+
 from PIL import Image
 Image.CUBIC = Image.BICUBIC
 import tkinter as tk
 from tkinter import *
 from tkinter import messagebox
 import ttkbootstrap as ttk
-import time
-import requests as r
-import json
-from scipy.signal import find_peaks
-import numpy as np
-import pyttsx3
+import speech
+import discovery
+import history
 from tkinter.simpledialog import askstring
-import ipaddress
 import os
 from functions import *
-import threading
 import queue
 import calendar
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+# Heavy modules are imported on first use (see load_detection_modules and generate_plot)
+pipeline = None     # Counting pipeline of the phone (see pipeline.py), created once detection starts
+calibration = None  # Loaded with the last user's profile, after the window is up
+calibration_blocks = None   # Resampled (times, values) blocks while calibrating, else None
+calibration_started = 0
+current_user = history.default_user     # Whose squats are counted and saved
+detection_engine = 'peaks'  # Name of the detection engine (see detector.engines)
 
 # Parameters for squat detection
-buffer_size = 500 # higher buffer size for better accuracy
-data_buffer = []
-last_peak_time = time.time()
-max_peak_index = 0
-squats_count = 0
+sample_rate = 50    # Samples are resampled to this rate (per second) before detection
+window_length = 50  # Moving window (seconds); longer windows are more accurate
 height_threshold = 11.5
-distance_threshold = 8
+distance_threshold = 0.8    # Minimum time between peaks (seconds)
 min_peak_interval = 1.0
 target_squats = 10
 
 voice_index = 0
 volume = 1
 
-def get_accZ(): 
-    try:
-        response = r.get(url + '&' + 'accZ').text
-        data = json.loads(response)
-        
-        accZ = data.get('buffer', {}).get('accZ', {}).get('buffer', [None])[0]
-        
-        if accZ is not None:
-            try:
-                accZ = float(accZ)
-            except ValueError:
-                print("Error: Could not convert accZ to float")
-                return None
-    except r.exceptions.RequestException as e:
-        print(f"Error: {e}")
-        my_meter.configure(subtext="Connection lost!")
-        return None
-        
-    return accZ
-
-def get_accAbs(): 
-    try:
-        response = r.get(url + '&' + 'acc').text
-        data = json.loads(response)
-        
-        acc = data.get('buffer', {}).get('acc', {}).get('buffer', [None])[0]
-        
-        if acc is not None:
-            try:
-                acc = float(acc)
-            except ValueError:
-                print("Error: Could not convert acc to float")
-                return None
-    except r.exceptions.RequestException as e:
-        print(f"Error: {e}")
-        my_meter.configure(subtext="Connection lost!")
-        return None
-        
-    return acc
+# Live events for dashboards (see event_server.py); only set up when --events-port is given
+event_hub = None
+
+def publish_event(event, **fields):
+    if event_hub is not None:
+        event_hub.publish(event, station=ip_address, **fields)
+
+def start_events_server():
+    global event_hub
+    from event_server import EventHub, start_event_server
+    event_hub = EventHub()
+    start_event_server(event_hub, args.events_port)
+    print(f"Serving live events on http://0.0.0.0:{args.events_port}/")
+
+def new_detector():
+    # A detector of the selected engine with the sliders' settings and the command line's engine options
+    from detector import detector_from_args
+    return detector_from_args(args, detection_engine, window=window_length, height_threshold=height_threshold,
+                              distance=distance_threshold, min_peak_interval=min_peak_interval, sample_rate=sample_rate)
+
+def load_detection_modules():
+    # requests and scipy are only needed once detection starts, after the window is up
+    global pipeline
+    from detector import engines
+    from pipeline import PhoneSource, CountingPipeline
+    # Unless --no-remote-control, this starts a fresh experiment on the phone for the session
+    source = PhoneSource(url, signal_name(), control=not args.no_remote_control)
+    pipeline = CountingPipeline(source, new_detector(), sample_rate, target_squats)
+    engine_selector.configure(values=list(engines))
+    startup_marks.append(('detection modules loaded', time.perf_counter()))
+
+def report_startup_time():
+    start = startup_marks[0][1]
+    print("Startup time:")
+    for label, mark in startup_marks[1:]:
+        print(f"  {label}: {mark - start:.2f} s")
+
+def signal_name():
+    # Signal of the acceleration buttons (see pipeline.PhoneSource)
+    if fusion_button_var.get() == 1:
+        return 'fused'      # Vertical acceleration whatever the phone's orientation
+    return 'abs' if acc_button_var.get() == 1 else 'z'
+
+# View-model for the meter: detection only changes these fields, and render_meter pushes the
+# fields that changed to the widget at most meter_fps times per second
+meter_fps = 15
+meter_state = {'amountused': 0, 'amounttotal': target_squats, 'subtext': "Squats done"}
+rendered_meter_state = dict(meter_state)
+
+def set_meter(**fields):
+    meter_state.update(fields)
+
+def render_meter():
+    changed = {key: value for key, value in meter_state.items() if rendered_meter_state.get(key) != value}
+    if changed:
+        # Record what is being pushed first, so on_meter_drag can tell our updates from the user's
+        rendered_meter_state.update(changed)
+        my_meter.configure(**changed)
+    root.after(1000 // meter_fps, render_meter)
+
+def on_meter_drag(*args):
+    # The meter is interactive: a count the user drags to (to fix a false detection) becomes the new count
+    value = int(my_meter.amountusedvar.get())
+    if value != rendered_meter_state['amountused']:
+        if pipeline is not None:
+            pipeline.count = value
+        meter_state['amountused'] = rendered_meter_state['amountused'] = value
 
 def set_target_squats():
     global target_squats
     target_squats = int(target_squats_spinbox.get())
-    my_meter.configure(amounttotal=target_squats)
-    my_meter.configure(amountused=0)
-    # speak(f"Your target number of squats is {target_squats}", voice_index, volume)
+    set_meter(amounttotal=target_squats, amountused=0)
+    if pipeline is not None:
+        pipeline.start_set(target_squats)   # A new set
+    # speak(f"Your target number of squats is {target_squats}")
     target_squats_button.config(text=f"Target Squats: {target_squats}")
+    prepare_voice_cues()
 
 def on_voice_select(event):
     global voice_index
     selected_voice = voice_selector.get()
     # print("Selected voice:", selected_voice)
     voice_index = int(selected_voice.split()[-1]) - 1
+    speech.set_voice(voice_index)
+    prepare_voice_cues()
     # print("Voice index:", voice_index)
 
 def toggle_volume():
     global volume
     if voice_var.get() == 0:
         volume = 1
+        speech.set_volume(volume)
         voice_button.config(text="Turn Voice Off")
         print("Value:", voice_var.get())
     else:
         volume = 0
+        speech.set_volume(volume)
         voice_button.config(text="Turn Voice On")
         print("Value:", voice_var.get())
 
@@ -107,202 +152,343 @@ def toggle_acc():
     else:
         acc_button.config(text="Use Absolute acceleration")
 
+def toggle_fusion():
+    # Sensor fusion replaces the z/absolute choice while it is on; the movement classifier needs the raw
+    # x/y/z stream, which the fused signal doesn't fetch, so "Count Squats Only" is off meanwhile
+    if fusion_button_var.get() == 1:
+        fusion_button.config(text="Using Sensor Fusion")
+        acc_button.config(state="disabled")
+        if classify_var.get() == 1:
+            classify_var.set(0)
+            toggle_classification()
+        classify_button.config(state="disabled")
+    else:
+        fusion_button.config(text="Use Sensor Fusion")
+        acc_button.config(state="normal")
+        classify_button.config(state="normal")
+
 def show_acc_threshold(event):
     global height_threshold
     acceleration_threshold_label.config(text=f"Acceleration Threshold: {acceleration_threshold_slider.get():.2f} m/s\u00b2") # Update the label with the current value
     height_threshold = float(acceleration_threshold_slider.get())
 
-def set_buffer_size(event):
-    global buffer_size
-    buffer_size_label.config(text=f"Moving Window size: {int(buffer_size_slider.get())} samples") # Update the label with the current value
-    buffer_size = int(buffer_size_slider.get())
+def set_window_length(event):
+    global window_length
+    window_length = int(window_length_slider.get())
+    show_window_length() # Update the label with the current value
+
+def show_window_length():
+    # The adaptive engine sizes the window to the tempo, up to the slider's length
+    text = f"Moving Window: {window_length} seconds"
+    if pipeline is not None and getattr(pipeline.detector, 'adaptive', False):
+        stats = pipeline.detector.window_stats()
+        text = f"Moving Window: {stats['window']:g} of {window_length} s ({stats['scanned_share']:.0%} of the samples scanned)"
+    if window_length_label.cget('text') != text:
+        window_length_label.config(text=text)
 
 def set_min_peak_interval(event):
     global min_peak_interval
     min_peak_interval_label.config(text=f"Minimum time b/w squats: {min_peak_interval_slider.get():.1f} seconds") # Update the label with the current value
     min_peak_interval = float(min_peak_interval_slider.get())
 
+def apply_profile(settings):
+    # The sliders' handlers update the detection settings and their labels
+    global distance_threshold
+    acceleration_threshold_slider.set(settings['height_threshold'])
+    show_acc_threshold(None)
+    min_peak_interval_slider.set(settings['min_peak_interval'])
+    set_min_peak_interval(None)
+    window_length_slider.set(settings['window'])
+    set_window_length(None)
+    distance_threshold = settings['distance']
+
+def select_user(name):
+    # Counting continues for the new user; their calibrated settings are loaded if they have any
+    global current_user
+    current_user = name
+    history.add_user(name)
+    calibration.remember_user(name)
+    user_selector.configure(values=history.users())
+    user_selector.set(name)
+    root.title(f"Squat-O-Meter - {name}")
+    settings = calibration.get_profile(name)
+    if settings:
+        print(f"Loaded profile of {name}: {settings}")
+        apply_profile(settings)
+
+def toggle_classification():
+    # Only squats are counted while on; x and y are only fetched while it is on
+    if pipeline is None:
+        return      # Detection hasn't started yet; the classifier is set up with it
+    if classify_var.get() == 1:
+        from classifier import MovementClassifier
+        pipeline.source.set_classifier(MovementClassifier())
+    else:
+        pipeline.source.set_classifier(None)
+
+def on_engine_select(event):
+    # The new engine starts with an empty window; the count goes on
+    global detection_engine
+    detection_engine = engine_selector.get()
+    if pipeline is not None:
+        pipeline.detector = new_detector()
+    print("Detection engine:", detection_engine)
+
+def on_user_select(event):
+    name = user_selector.get().strip()
+    if name and name != current_user:
+        select_user(name)
+
+def load_last_user():
+    global calibration
+    import calibration
+    name, _ = calibration.last_profile()
+    select_user(name or history.default_user)
+
+def toggle_calibration():
+    global calibration_blocks, calibration_started
+    if calibrate_button_var.get() == 1:
+        # Record the signal until the user presses Finish (or the time runs out); counting is paused
+        calibration_blocks = []
+        calibration_started = time.time()
+        calibrate_button.config(text="Finish Calibration")
+        set_meter(subtext="Calibrating...")
+        speak(f"Do {calibration.calibration_reps} squats, then press finish")
+        return
+
+    import numpy as np
+    blocks, calibration_blocks = calibration_blocks or [], None
+    calibrate_button.config(text="Calibrate")
+    set_meter(subtext="Squats done")
+    try:
+        settings = calibration.analyze_reps(np.concatenate([block[0] for block in blocks] + [[]]),
+                                            np.concatenate([block[1] for block in blocks] + [[]]))
+    except ValueError as e:
+        messagebox.showerror("Calibration Failed", f"Could not calibrate: {e}. Please try again.")
+        return
+
+    calibration.save_profile(current_user, settings)
+    apply_profile(settings)
+    messagebox.showinfo("Calibration Done",
+                        f"Saved for {current_user}: threshold {settings['height_threshold']:.2f} m/s\u00b2, minimum time "
+                        f"b/w squats {settings['min_peak_interval']:.1f} s, window {settings['window']} s.")
+
+# Live signal panel, created the first time it is shown (this is what loads matplotlib)
+live_plot = None
+window_width = 850
+window_height = 910
+live_plot_height = 190
+
+def set_window_height(height):
+    root.geometry(f"{window_width}x{height}")
+    root.minsize(window_width, height)
+    root.maxsize(window_width, height)
+
+def toggle_live_plot():
+    global live_plot
+    if live_plot_var.get() == 1:
+        if live_plot is None:
+            from live_plot import LivePlot
+            live_plot = LivePlot(live_plot_frame, window_length * sample_rate, height_threshold)
+        set_window_height(window_height + live_plot_height)
+        live_plot_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        live_plot_button.config(text="Hide Live Signal")
+    else:
+        live_plot_frame.pack_forget()
+        set_window_height(window_height)
+        live_plot_button.config(text="Show Live Signal")
+
 def selected_month(month):
     month_menu.config(text=month)
     #print("Selected month:", month)
+    restart_report()
 
 ################################################
-# Define a global variable to hold the reference to the plot canvas
-plot_canvas = None
-
-def generate_plot():
-    global plot_canvas
+# Reports are computed and rendered by a background worker (see reports.py); the Tk thread only shows
+# the finished image, so counting never pauses while a report is made
+report_worker = None
+report_generation = None    # Generation of the report being made, None when idle
+report_kind = None          # Report function of the latest request
+report_image = None         # Keeps the shown PhotoImage alive
+
+def request_report(report):
+    global report_worker, report_generation, report_kind
+    import reports
+    if report_worker is None:
+        report_worker = reports.ReportWorker()
     selected_month = month_menu.cget("text")
     selected_month_number = list(calendar.month_name).index(selected_month)
     selected_year = int(year_spinbox.get())
-    
-    # Read the data from the CSV file
-    try:
-        df = pd.read_csv('database.csv')
-    except FileNotFoundError:
-        messagebox.showerror("Error", "CSV file not found!")
-        return
-    
-    # Filter the DataFrame for the selected month and year
-    df_selected = df[(df['Month'] == selected_month_number) & (df['Year'] == selected_year)]
-    
-    if df_selected.empty:
-        messagebox.showinfo("Info", "No data available for the selected month and year!")
-        return
+    # Render at the size of the plot area (or the old fixed 8 x 6 inch size before it is laid out)
+    width, height = plot_frame.winfo_width(), plot_frame.winfo_height()
+    size = (width, height) if width > 100 and height > 100 else (800, 600)
+    report_kind = report
+    report_generation = report_worker.submit(getattr(reports, report), current_user, selected_year,
+                                             selected_month_number, selected_month, size)
+    report_progress.grid()
+    report_progress['value'] = 0
+
+def restart_report():
+    # Picking another month or year cancels the report being made and starts it for the new selection
+    if report_generation is not None:
+        request_report(report_kind)
 
-    # Create a DataFrame with all dates in the selected month
-    days_in_month = range(1, 32)  # Assuming maximum of 31 days in a month for simplicity
-    
-    # Merge with existing DataFrame to fill missing dates with count 0
-    df_month = pd.DataFrame({'Day': days_in_month}).merge(df_selected, on='Day', how='left').fillna(0)
-
-    # Group by day and sum the counts
-    df_daily_sum = df_month.groupby('Day')['Count'].sum().reset_index()
-
-    # Create a new figure for the plot with fixed size
-    fig, ax = plt.subplots(figsize=(8, 6))
-
-    # Plot the count values for the selected month
-    #fig, ax = plt.subplots()
-    ax.plot(df_daily_sum['Day'], df_daily_sum['Count'], marker='o')
-    ax.set_xlabel('Day')
-    ax.set_ylabel('Squats done')
-    ax.set_title(f'Progress report for {selected_month}, {selected_year}')
-
-    # Calculate and display the total count for the month
-    total_count = df_month['Count'].sum()
-    ax.text(0.05, 0.95, f'Total Squats: {total_count}', horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
-
-    # Count the number of days when the count is greater than 10
-    days_gt_10 = (df_month['Count'] > 10).sum()  # Counting days in df_month
-    ax.text(0.05, 0.9, f'Days with Squats > 10: {days_gt_10}', horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
-
-    # Find the longest streak of consecutive days with count > 0
-    streak = 0
-    max_streak = 0
-    for count in df_month['Count']:
-        if count > 0:
-            streak += 1
-        else:
-            max_streak = max(max_streak, streak)
-            streak = 0
-    max_streak = max(max_streak, streak)  # Update max_streak for the last streak
-    ax.text(0.05, 0.85, f'Longest Streak: {max_streak} days', horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
+def generate_plot():
+    request_report('month_report')
+
+def generate_tempo_plot():
+    request_report('tempo_report')
 
-    # If there is an existing plot canvas, destroy it
-    if plot_canvas:
-        plot_canvas.get_tk_widget().destroy()
+def generate_leaderboard():
+    request_report('leaderboard_report')
 
-    # Embed the plot in the Tkinter window
-    plot_canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-    plot_canvas.draw()
-    plot_canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+def check_report_results():
+    global report_generation, report_image
+    while report_worker is not None:
+        try:
+            generation, kind, value = report_worker.results.get_nowait()
+        except queue.Empty:
+            break
+        if generation != report_generation:
+            continue    # A cancelled report
+        if kind == 'progress':
+            report_progress['value'] = value * 100
+            continue
+        report_generation = None
+        report_progress.grid_remove()
+        if kind == 'done':
+            from PIL import ImageTk
+            report_image = ImageTk.PhotoImage(value)
+            plot_label.config(image=report_image)
+        elif kind == 'nodata':
+            messagebox.showinfo("Info", value)
+        else:
+            messagebox.showerror("Report Failed", f"Could not make the report: {value}")
+    root.after(100, check_report_results)
 
 ################################################
 
 
+# Results of background saves, handed from the writer thread to the Tk thread
+save_results = queue.Queue()
+
 def save_data():
     if save_button_var.get() == 1:
         # print("Data will be saved to database")
-        confirm_save(squats_count)
+        count, reps = (pipeline.count, pipeline.rep_tracker.finish()) if pipeline is not None else (0, [])
+        if confirm_save(count, callback=lambda count, error: save_results.put((count, error)),
+                        reps=reps, user=current_user):
+            if pipeline is not None:
+                pipeline.rep_tracker.clear()    # These reps are saved; the next save starts a new session
         save_button_var.set(0)
     # else:
     #     print("Data will not be saved to database")
 
-# Create a queue to hold text to be spoken
-speech_queue = queue.Queue()
-
-# Define a function to speak the text
-def speak_thread():
+def check_save_results():
+    # Report finished saves on the Tk thread without blocking the detection loop
     while True:
-        text = speech_queue.get()
-        if text is None:
+        try:
+            count, error = save_results.get_nowait()
+        except queue.Empty:
             break
-        engine.say(text)
-        engine.runAndWait()
-
-# Start a new thread to handle speech synthesis
-threading.Thread(target=speak_thread, daemon=True).start()
-
-# Modify the speak function to accept the text to be spoken as an argument
-def speak(text, voice_index=1, volume=1):
+        if error is None:
+            print("Saved to database")
+            messagebox.showinfo("Save Successful", f"{count} squats saved successfully!")
+        else:
+            messagebox.showerror("Save Failed", f"Could not save {count} squats: {error}")
+    root.after(200, check_save_results)
+
+def on_close():
+    # Make sure queued saves reach the disk before the app exits
+    flush_saves()
+    if pipeline is not None:
+        pipeline.source.close()
+    speech.stop()
+    root.destroy()
+
+# Voice and volume are pushed to the speech worker when they change, so only the text is needed here
+def speak(text, kind='phrase'):
     if volume == 0:
         return
-    # Get available voices
-    voices = engine.getProperty('voices')
-
-    # Set the desired voice
-    engine.setProperty('voice', voices[voice_index].id)
+    speech.say(text, kind)
 
-    # Set properties (optional)
-    engine.setProperty('rate', 250)  # You can adjust the speaking rate
-    engine.setProperty('volume', volume)  # You can adjust the volume 
+def congratulations_text(target):
+    return f"Congratulations! You have reached your target of {target} squats!"
 
-    # Put the text into the speech queue
-    speech_queue.put(text)
+def prepare_voice_cues():
+    # Pre-render every count up to the target, plus the final message, for the selected voice
+    speech.prepare_cues([str(i) for i in range(1, target_squats + 1)] + [congratulations_text(target_squats)])
 
 # Function to detect squats and update the meter
 def detect_squats():
-    global squats_count
-    global data_buffer
-    global last_peak_time
-    global max_peak_index
-    global target_squats
-    global acc_button_var
-    
-    if acc_button_var.get() == 1:
-        # print("Using absolute acceleration")  
-        accZ = get_accAbs()
-    else:   
-        # print("Using acceleration in Z direction") 
-        accZ = get_accZ()
-
-    # If the connection is not refused and the squats count is less than the target squats
-    if accZ is not None and squats_count < target_squats:
-        my_meter.configure(subtext="Squats done")
-    
-    data_buffer.append(accZ)
-    if len(data_buffer) > buffer_size:
-        data_buffer = data_buffer[-buffer_size:]
-    
-    peaks, _ = find_peaks(data_buffer, height= height_threshold, distance= distance_threshold)  
-
-    if len(peaks) > 0:
-        current_time = time.time()
-        if (peaks[-1] > max_peak_index) and (current_time - last_peak_time > min_peak_interval):
-                squats_count += 1
-                # speak(str(squats_count), voice_index, volume)
-                last_peak_time = current_time
-                max_peak_index = peaks[-1]
-                print("Squat detected! Count:", squats_count)
-                if squats_count < target_squats:
-                    speak(str(squats_count), voice_index, volume)
-                    my_meter.configure(amountused=squats_count)
-                    # my_meter.configure(subtext="Squats done")
-                elif squats_count == target_squats:    
-                    my_meter.configure(amountused=target_squats)
-                    my_meter.configure(subtext="Target completed!")
-                    speak(target_squats, voice_index, volume)
-                    speak(f"Congratulations! You have reached your target of {target_squats} squats!", voice_index, volume)
-                else:
-                    squats_count = 0
-                    my_meter.configure(amountused=squats_count)
-                    my_meter.configure(subtext="Squats done")
-                    target_squats_button.config(text=f"Set Target Squats")
+    if pipeline is None:
+        load_detection_modules()
+        if classify_var.get() == 1:
+            toggle_classification()
+    detector = pipeline.detector
+
+    if pipeline.source.set_signal(signal_name()):
+        pipeline.reset_signal()
+
+    # Pick up the current slider values
+    detector.window = window_length
+    detector.height_threshold = height_threshold
+    detector.distance = distance_threshold
+    detector.min_peak_interval = min_peak_interval
+    if hasattr(detector, 'keep_window'):
+        # Engines that can do without the moving window only keep it while the live plot is shown
+        detector.keep_window = live_plot is not None and live_plot_var.get() == 1
+
+    # Everything the phone recorded since the last tick, on an even time grid
+    events, (times, values) = pipeline.read()
+
+    # While connected and short of the target, the subtext tells whether the movement is being counted
+    classifier = pipeline.classifier
+    if pipeline.connected and pipeline.count < target_squats:
+        if classifier is not None and not classifier.allows_counting():
+            set_meter(subtext=f"{classifier.label.capitalize()}: not counted")
         else:
-             max_peak_index = peaks[-1]                         # As the buffer moves, the max_peak_index will change (reduce the index to the last peak detected)
-             squats_count = int(my_meter.amountusedvar.get())   # Update the squats count from the interactive meter
-    
+            set_meter(subtext="Squats done")
+
+    if calibration_blocks is not None:
+        calibration_blocks.append((times, values))
+        if time.time() - calibration_started > calibration.calibration_max_time:
+            calibrate_button_var.set(0)
+            toggle_calibration()
+    else:
+        events += pipeline.count_block(times, values)
+        show_window_length()
+        # The panel throttles itself to its frame rate, so this is cheap on most ticks; hidden, it isn't drawn
+        if live_plot is not None and live_plot_var.get() == 1:
+            live_plot.update(detector.data_buffer, detector.peaks, detector.buffer_size, height_threshold)
+
+    for event, fields in events:
+        if event == 'connection' and fields['state'] == 'lost':
+            print(f"Error: {fields['error']}")
+            set_meter(subtext="Connection lost!")
+        elif event == 'ignored':
+            print(f"Not counted ({fields['label']}):", fields['reps'])
+        elif event == 'rep':
+            print("Squat detected! Count:", fields['count'])
+            if fields['count'] < target_squats:
+                speak(fields['count'], kind='count')
+                set_meter(amountused=fields['count'])
+        elif event == 'target':
+            set_meter(amountused=target_squats, subtext="Target completed!")
+            speak(target_squats, kind='count')
+            speak(congratulations_text(target_squats))
+        elif event == 'reset':
+            set_meter(amountused=0, subtext="Squats done")
+            target_squats_button.config(text=f"Set Target Squats")
+        publish_event(event, **fields)
+
     # Schedule the function to run again after a short delay
     root.after(100, detect_squats)
 
 root = ttk.Window(themename="superhero")
 root.title("Squat-O-Meter")
-root.geometry("850x870")
-
-# Set minimum and maximum size of the window
-root.minsize(850, 870)
-root.maxsize(850, 870)
+# Set the size of the window (also used as its minimum and maximum size)
+set_window_height(window_height)
 
 # Get the path to the script
 script_dir = os.path.dirname(__file__)
@@ -311,20 +497,36 @@ script_dir = os.path.dirname(__file__)
 icon_path = os.path.join(script_dir, "icon.ico")
 root.iconbitmap(icon_path)
 
+# Scan the local network for Phyphox servers so the address only needs to be confirmed
+found_devices = discovery.discover()
+if found_devices:
+    print('Phyphox found at:', ', '.join(found_devices))
+    ip_prompt = 'Phyphox found at: ' + ', '.join(found_devices) + '\nPlease enter the IP address:'
+else:
+    ip_prompt = 'Please enter the IP address:'
+
 # Use the queryDialog to prompt the user for input
+startup_marks.append(('IP dialog shown', time.perf_counter()))
 while True:
-    ip_address = askstring('Enter IP Address', 'Please enter the IP address:', parent=root)
+    ip_address = askstring('Enter IP Address', ip_prompt, parent=root,
+                           initialvalue=found_devices[0] if found_devices else None)
     if ip_address is None:
         # User clicked cancel, break out of the loop
         break
     elif is_valid_ip(ip_address):
-        print('Entered IP address:', ip_address)
-        break  # Break out of the loop if the IP address is valid
+        # Check that Phyphox actually answers before building the UI around it
+        if (ip_address in found_devices or discovery.probe(ip_address, timeout=1.0) or
+                messagebox.askyesno('No Response', f'No Phyphox server answered at {ip_address}:8080. Use it anyway?')):
+            print('Entered IP address:', ip_address)
+            break  # Break out of the loop if the IP address is valid
     else:
         messagebox.showerror('Error', 'Invalid IP address entered')
 
 url = 'http://' + ip_address + ':8080/get?'
 
+# Don't count the time the user spent typing the address
+startup_marks.append(('IP entered', time.perf_counter()))
+
 # Create the notebook
 notebook = ttk.Notebook(root)
 notebook.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -350,27 +552,52 @@ target_squats_spinbox.grid(row=0, column=1, padx=10, pady=20)
 # Set the default value of the spinbox to 5
 target_squats_spinbox.set(10)
 
+# Create a combobox to pick the user (type a new name and press Enter to add a user)
+user_selector = ttk.Combobox(entry_frame, bootstyle="success", values=[current_user], font=("Helvetica", 10), width=14)
+user_selector.grid(row=2, column=1, padx=20, pady=(10, 0))
+user_selector.set(current_user)
+user_selector.bind("<<ComboboxSelected>>", on_user_select)
+user_selector.bind("<Return>", on_user_select)
+
+# Create a combobox to pick the detection engine (peaks is the most accurate, hysteresis the cheapest)
+engine_selector = ttk.Combobox(entry_frame, bootstyle="success", values=[detection_engine], state="readonly",
+                               font=("Helvetica", 10), width=12)
+engine_selector.grid(row=2, column=0, padx=20, pady=(10, 0))
+engine_selector.set(detection_engine)
+engine_selector.bind("<<ComboboxSelected>>", on_engine_select)
+
+# Create a checkbutton to count squats only (other movements are recognized and ignored)
+classify_var = IntVar()
+classify_button = ttk.Checkbutton(entry_frame,
+                                  bootstyle="success, round-toggle",
+                                  text="Count Squats Only",
+                                  variable=classify_var,
+                                  onvalue=1,
+                                  offvalue=0,
+                                  command=toggle_classification)
+classify_button.grid(row=2, column=2, padx=20, pady=(10, 0))
+
 # Create a button to set the target number of squats
 target_squats_button = ttk.Button(entry_frame, text="Set Target Squats", command=set_target_squats)
 target_squats_button.grid(row=1, column=1, padx=20)
 
-# Create buffer size slider
-buffer_size_slider = ttk.Scale(entry_frame, 
-                                          from_=100, 
-                                          to=500, 
+# Create moving window slider (seconds)
+window_length_slider = ttk.Scale(entry_frame, 
+                                          from_=10, 
+                                          to=50, 
                                           length=240, 
                                           orient="horizontal", 
                                           bootstyle="success",
-                                          command=set_buffer_size)
+                                          command=set_window_length)
 
-buffer_size_slider.grid(row=0, column=0, padx=20)
+window_length_slider.grid(row=0, column=0, padx=20)
 
-# Create a label to display the buffer size value
-buffer_size_label = ttk.Label(entry_frame, text="", font=("Helvetica", 10))
-buffer_size_label.grid(row=1, column=0, padx=20)
+# Create a label to display the moving window value
+window_length_label = ttk.Label(entry_frame, text="", font=("Helvetica", 10))
+window_length_label.grid(row=1, column=0, padx=20)
 
-# Set the default value of the buffer size slider
-buffer_size_slider.set(500)
+# Set the default value of the moving window slider
+window_length_slider.set(50)
 
 # Create minimum peak interval slider
 min_peak_interval_slider = ttk.Scale(entry_frame,
@@ -417,15 +644,22 @@ my_meter = ttk.Meter(meter_frame, bootstyle="danger",
                      ) 
 my_meter.grid(row=0, column=1, padx=20)
 
+# Pick up counts the user sets by dragging on the meter
+my_meter.amountusedvar.trace_add("write", on_meter_drag)
+
 # create a frame to hold the widgets below the meter
 parameters_frame = ttk.Frame(tab1)
 parameters_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-# Get the number of voices available in the system
-no_of_voices = len(pyttsx3.init().getProperty('voices'))
+# The speech engine starts in the background, so the list begins with the default voice and is filled in once it is up
+voice_list = ['Voice 1']
 
-# List of voices available in the system
-voice_list = ['Voice {}'.format(i) for i in range(1, no_of_voices + 1)] # Create a list of voice names -> ['Voice 1', 'Voice 2', 'Voice 3', ...]
+def fill_voice_list():
+    if not speech.voices_ready.is_set():
+        root.after(200, fill_voice_list)
+        return
+    # Create a list of voice names -> ['Voice 1', 'Voice 2', 'Voice 3', ...]
+    voice_selector.configure(values=['Voice {}'.format(i) for i in range(1, len(speech.voices) + 1)])
 
 # Create a combobox widget to select the voice (dropdown menu)
 voice_selector = ttk.Combobox(parameters_frame, bootstyle="success", values = voice_list, state="readonly", font=("Helvetica", 10), width=10)
@@ -437,6 +671,7 @@ voice_selector.set(voice_list[0]) # Set the default voice to the first voice in
 # Bind the event to the combobox
 voice_selector.bind("<<ComboboxSelected>>", on_voice_select)
 
+
 # Create a toolbutton to turn on/off the voice feedback
 voice_var = IntVar()
 voice_button = ttk.Checkbutton(parameters_frame, 
@@ -465,6 +700,19 @@ acc_button = ttk.Checkbutton(parameters_frame,
                              )
 acc_button.grid(row=0, column=1, padx=25, pady=10)
 
+# Round toggle button to use the fused vertical acceleration (x/y/z plus gyroscope/magnetometer if available)
+fusion_button_var = IntVar()
+fusion_button = ttk.Checkbutton(parameters_frame,
+                                bootstyle="success, round-toggle",
+                                text="Use Sensor Fusion",
+                                variable=fusion_button_var,
+                                onvalue=1,
+                                offvalue=0,
+                                command=toggle_fusion,
+                                style="success.TCheckbutton"
+                                )
+fusion_button.grid(row=2, column=0, padx=25, pady=10)
+
 # Create a check button to ask user to save the data to database
 save_button_var = IntVar()
 save_button = ttk.Checkbutton(  parameters_frame,
@@ -477,6 +725,33 @@ save_button = ttk.Checkbutton(  parameters_frame,
                                 command=save_data)
 save_button.grid(row=1, column=1, padx=15, pady=10)
 
+# Create a check button to show the live signal and detected peaks below the parameters
+live_plot_var = IntVar()
+live_plot_button = ttk.Checkbutton(parameters_frame,
+                                   bootstyle="info, toolbutton, outline",
+                                   text="Show Live Signal",
+                                   variable=live_plot_var,
+                                   width=22,
+                                   onvalue=1,
+                                   offvalue=0,
+                                   command=toggle_live_plot)
+live_plot_button.grid(row=2, column=1, padx=15, pady=10)
+
+# Create a check button to calibrate the detection settings from a few squats
+calibrate_button_var = IntVar()
+calibrate_button = ttk.Checkbutton(parameters_frame,
+                                   bootstyle="warning, toolbutton, outline",
+                                   text="Calibrate",
+                                   variable=calibrate_button_var,
+                                   width=22,
+                                   onvalue=1,
+                                   offvalue=0,
+                                   command=toggle_calibration)
+calibrate_button.grid(row=2, column=2, padx=15, pady=10)
+
+# Frame for the live signal panel (packed only while the panel is shown)
+live_plot_frame = ttk.Frame(tab1, height=live_plot_height)
+
 # Create a label to display the acceleration threshold value
 acceleration_threshold_label = ttk.Label(parameters_frame, text="", font=("Helvetica", 10))
 acceleration_threshold_label.grid(row=1, column=2, padx=20)
@@ -530,7 +805,7 @@ month_menu['menu'] = inside_menu
 year_spinbox = ttk.Spinbox(widget_frame, from_=2024, to=2100, 
                                     bootstyle="primary", 
                                     font=("Helvetica", 11), 
-                                    state="readonly", width=8)
+                                    state="readonly", width=8, command=restart_report)
 year_spinbox.grid(row=0, column=1, padx=0, pady=30)
 
 # Set the default value of the spinbox to 2024
@@ -551,20 +826,66 @@ plot_month_button = ttk.Button(widget_frame, text="Show Month Data", command=gen
                                style="success.Outline.TButton")
 plot_month_button.grid(row=0, column=2, padx=(90,0), pady=30)
 
+############# Create a button to plot the tempo of the saved reps ################
+
+plot_tempo_button = ttk.Button(widget_frame, text="Show Tempo", command=generate_tempo_plot,
+                               bootstyle="success",
+                               style="success.Outline.TButton")
+plot_tempo_button.grid(row=1, column=2, padx=(90,0), pady=(0,10))
+
+############# Create a button to show the monthly leaderboard of all users ################
+
+leaderboard_button = ttk.Button(widget_frame, text="Show Leaderboard", command=generate_leaderboard,
+                                bootstyle="success",
+                                style="success.Outline.TButton")
+leaderboard_button.grid(row=1, column=0, padx=(55,90), pady=(0,10))
+
 ############# End of button to fetch the data ################
 
+############# Progress of the report being made (hidden when idle) ################
+
+report_progress = ttk.Progressbar(widget_frame, mode='determinate', maximum=100, bootstyle="success-striped")
+report_progress.grid(row=2, column=0, columnspan=3, sticky='ew', padx=55, pady=(0,10))
+report_progress.grid_remove()
+
 ############# Create a frame to hold the plot ################
 plot_frame = ttk.Frame(tab2)
 plot_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+plot_label = ttk.Label(plot_frame, anchor='center')
+plot_label.pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+
+
+def start_background_work():
+    startup_marks.append(('window ready', time.perf_counter()))
+
+    if args.events_port:
+        start_events_server()
+
+    # Start the speech worker (the only place the TTS engine is created) and render the default cues
+    speech.start()
+    prepare_voice_cues()
+    fill_voice_list()
+
+    # The user selected last, with their calibrated settings; counting starts even if that fails
+    try:
+        load_last_user()
+    except Exception as e:
+        print(f"Error: Could not load the last user: {e}")
+        messagebox.showerror("History Unavailable", f"Could not open the squat history: {e}")
+
+    # Start the squat detection function and the meter renderer
+    detect_squats()
+    render_meter()
 
+    report_startup_time()
 
-# Initialize the pyttsx3 engine outside the speak function
-engine = pyttsx3.init()
+# Defer everything that is not needed to draw the window until the event loop is running
+root.after_idle(start_background_work)
 
-# Start the squat detection function
-detect_squats()
+# Start polling for finished background saves and reports
+check_save_results()
+check_report_results()
 
-# Call engine.runAndWait() before the main event loop to ensure any pending speech is spoken
-engine.runAndWait()
+root.protocol("WM_DELETE_WINDOW", on_close)
 
 root.mainloop()
@@ -0,0 +1,162 @@
+"""
+Reading sensor buffers from the Phyphox remote-access interface, and controlling its experiment.
+
+"""
+
+import json
+import numpy as np
+import requests as r
+
+phyphox_port = 8080
+
+def make_url(ip_address, port=phyphox_port):
+    return f'http://{ip_address}:{port}/get?'
+
+def get_since(url, buffer_names, since=None, time_buffer='acc_time', timeout=2.0):
+    """
+    Returns every sample of the given buffers recorded after time `since` (seconds of experiment time),
+    together with their times, fetched with a single request, as a dict of name -> float array (the
+    times under `time_buffer`). With since=None only the latest sample is returned. Buffers the
+    experiment doesn't have come back empty.
+    Connection problems raise requests.exceptions.RequestException.
+
+    """
+    names = list(dict.fromkeys([time_buffer] + list(buffer_names)))
+    if since is None:
+        query = '&'.join(names)
+    else:
+        query = '&'.join(f'{name}={float(since)!r}|{time_buffer}' for name in names)
+    response = r.get(url + query, timeout=timeout).text
+    try:
+        buffers = json.loads(response).get('buffer', {})
+    except ValueError:
+        print("Error: Phyphox sent an invalid response")
+        buffers = {}
+
+    arrays = {name: np.array(buffers.get(name, {}).get('buffer') or [], dtype=float) for name in names}
+    # A buffer can be a sample ahead of another if the phone wrote to it while answering
+    length = min((len(arrays[name]) for name in names if name in buffers), default=0)
+    return {name: values[:length] for name, values in arrays.items()}
+
+class BufferStream:
+    """
+    Reads one Phyphox buffer incrementally: each fetch() returns only the samples recorded since the
+    previous one, with their timestamps. The timestamps keep increasing when the experiment is cleared
+    (its clock starts from zero again): they continue from the last sample fetched before the clear.
+
+    """
+    def __init__(self, url, buffer_name, time_buffer='acc_time', extra_buffers=()):
+        self.url = url
+        self.buffer_name = buffer_name
+        self.time_buffer = time_buffer
+        self.extra_buffers = [name for name in extra_buffers if name != buffer_name]   # Fetched along, see fetch_all
+        self.since = None       # Experiment time of the last sample fetched
+        self.offset = 0.0       # Added to the experiment times, so they keep increasing across clears
+
+    def reset(self):
+        # Start again from the latest sample
+        self.since = None
+
+    def restarted(self):
+        # The experiment was cleared: read from its new latest sample on, continuing the times
+        if self.since is not None:
+            self.offset += self.since
+        self.since = None
+
+    def fetch(self, timeout=2.0):
+        """
+        Returns (times, values) of the new samples as float arrays. Connection problems raise
+        requests.exceptions.RequestException.
+
+        """
+        times, buffers = self.fetch_all(timeout)
+        return times, buffers[self.buffer_name]
+
+    def fetch_all(self, timeout=2.0):
+        """
+        Like fetch(), but returns (times, {buffer name: values}) with the extra buffers too, all from the
+        same request.
+
+        """
+        data = get_since(self.url, [self.buffer_name] + self.extra_buffers, self.since, self.time_buffer, timeout)
+        times = data[self.time_buffer]
+        if len(times):
+            self.since = float(np.nanmax(times))
+        elif self.since is not None:
+            # Nothing new: if the experiment was cleared, its clock is now behind us and the threshold
+            # would hide every new sample, so check the latest time and start over if so
+            latest = get_since(self.url, [], None, self.time_buffer, timeout)[self.time_buffer]
+            if len(latest) and latest[-1] < self.since:
+                self.restarted()
+        return times + self.offset, {name: data[name] for name in [self.buffer_name] + self.extra_buffers}
+
+def control(url, command, timeout=2.0):
+    """
+    Sends 'start', 'stop' or 'clear' to the experiment of the Phyphox server at `url` (a /get URL from
+    make_url). Returns True if Phyphox accepted the command. Connection problems raise
+    requests.exceptions.RequestException.
+
+    """
+    control_url = url.rsplit('/get?', 1)[0] + '/control?cmd=' + command
+    response = r.get(control_url, timeout=timeout).text
+    try:
+        return bool(json.loads(response).get('result'))
+    except ValueError:
+        print(f"Error: Phyphox sent an invalid response to {command}")
+        return False
+
+class ExperimentControl:
+    """
+    Keeps the phone's experiment in step with a counting session: cleared and started when the session
+    starts, cleared between sets and stopped when the session ends. Phyphox keeps every sample since
+    the last clear, so clearing between sets (and, in long sets, whenever the buffers hold more than
+    max_buffer_time seconds) keeps the phone's memory bounded. The streams (BufferStreams) are told
+    about each clear, so their times keep increasing.
+
+    Commands that fail are reported and otherwise ignored: counting goes on without remote control.
+
+    """
+    def __init__(self, url, streams, max_buffer_time=300.0, quiet_time=3.0):
+        self.url = url
+        self.streams = list(streams)
+        self.max_buffer_time = max_buffer_time  # Seconds of samples the phone may hold
+        self.quiet_time = quiet_time            # Seconds without a rep before clearing in the middle of a set
+        self.clears = 0
+
+    def send(self, command):
+        try:
+            return control(self.url, command)
+        except r.exceptions.RequestException as e:
+            print(f"Error: Could not {command} the Phyphox experiment: {e}")
+            return False
+
+    def start_session(self):
+        self.clear()
+
+    def end_session(self):
+        self.send('stop')
+
+    def clear(self):
+        # Clearing may also stop the measurement, so it is started again right away
+        if self.send('clear'):
+            self.clears += 1
+            for stream in self.streams:
+                stream.restarted()
+        self.send('start')
+
+    def buffered_time(self):
+        # Seconds of samples the phone holds: the experiment time of the latest sample read
+        return max((stream.since for stream in self.streams if stream.since is not None), default=0.0)
+
+    def check(self, seconds_since_rep):
+        """
+        Clears the experiment if its buffers hold more than max_buffer_time seconds of samples and there
+        was no rep for quiet_time seconds (a clear can lose the samples of one poll), or anyway once they
+        hold twice as much. Call right after fetching. Returns True if it cleared.
+
+        """
+        buffered = self.buffered_time()
+        if buffered > 2 * self.max_buffer_time or (buffered > self.max_buffer_time and seconds_since_rep > self.quiet_time):
+            self.clear()
+            return True
+        return False
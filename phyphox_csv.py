@@ -0,0 +1,122 @@
+"""
+Reading CSV exports of the Phyphox "Acceleration with g" experiment.
+
+Small exports can be read whole with read_export. For long recordings, iter_blocks streams the file in
+fixed-size blocks of typed numpy columns and StreamPeakFinder finds peaks across the blocks, so counting
+runs in bounded memory however large the file is.
+
+"""
+
+import math
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks
+
+# Short names for the Phyphox export columns
+column_names = {
+    'Time (s)': 't',
+    'Acceleration x (m/s^2)': 'x',
+    'Acceleration y (m/s^2)': 'y',
+    'Acceleration z (m/s^2)': 'z',
+    'Absolute acceleration (m/s^2)': 'abs'
+}
+
+block_size = 200000     # Rows per block when streaming
+
+def read_export(path):
+    """
+    Reads a whole export into a DataFrame with the short column names (t, x, y, z, abs).
+
+    """
+    return pd.read_csv(path).rename(columns=column_names)
+
+def iter_blocks(path, columns=('t', 'z'), rows=block_size):
+    """
+    Streams an export as dicts of float64 arrays (short column names -> values), `rows` rows at a time.
+
+    """
+    wanted = [long_name for long_name, short_name in column_names.items() if short_name in columns]
+    for chunk in pd.read_csv(path, usecols=wanted, dtype=np.float64, chunksize=rows):
+        chunk = chunk.rename(columns=column_names)
+        yield {name: chunk[name].to_numpy() for name in columns}
+
+class StreamPeakFinder:
+    """
+    Runs find_peaks(height, distance) over a signal that arrives in blocks, reporting each peak exactly
+    once and with the same result as one find_peaks call over the whole signal.
+
+    Local maxima are found per block; the trailing samples that can't be decided yet (the last rising
+    edge or plateau) are carried into the next block. The distance rule is applied per cluster of maxima
+    that are closer than `distance` to each other, since maxima further apart never affect each other.
+    A cluster is resolved once the signal has moved `distance` samples past it, so memory stays bounded
+    by the block size plus the largest cluster. (Only when two maxima of exactly the same height compete
+    can the choice differ from find_peaks, which leaves that order unspecified.)
+
+    """
+    def __init__(self, height, distance):
+        self.height = height
+        self.distance = max(1, math.ceil(distance))
+        self.carry_t = np.empty(0)
+        self.carry_values = np.empty(0)
+        self.carry_start = 0        # Global index of the first carried sample
+        self.cluster = []           # Maxima (global index, time, value) not resolved yet
+
+    def resolve_cluster(self):
+        # The distance rule of find_peaks: keep the highest maxima first and drop lower ones too close to them
+        indices = np.array([peak[0] for peak in self.cluster])
+        keep = np.ones(len(indices), dtype=bool)
+        for i in np.argsort([peak[2] for peak in self.cluster])[::-1]:
+            if keep[i]:
+                close = np.abs(indices - indices[i]) < self.distance
+                close[i] = False
+                keep &= ~close
+        resolved = [peak for peak, kept in zip(self.cluster, keep) if kept]
+        self.cluster = []
+        return resolved
+
+    def add_maxima(self, indices, times, values):
+        resolved = []
+        for peak in zip(indices.tolist(), times.tolist(), values.tolist()):
+            if self.cluster and peak[0] - self.cluster[-1][0] >= self.distance:
+                resolved += self.resolve_cluster()
+            self.cluster.append(peak)
+        return resolved
+
+    def feed(self, t, values):
+        """
+        Adds a block of samples (times and values) and returns the newly decided peaks as a list of
+        (global index, time, value).
+
+        """
+        t = np.concatenate([self.carry_t, t])
+        values = np.concatenate([self.carry_values, values])
+        if len(values) == 0:
+            return []
+        maxima, _ = find_peaks(values, height=self.height)
+        resolved = self.add_maxima(maxima + self.carry_start, t[maxima], values[maxima])
+
+        # The final run of equal values and the sample before it decide whether the next block starts with a peak
+        changes = np.flatnonzero(values[1:] != values[:-1])
+        keep_from = changes[-1] if len(changes) else 0
+        self.carry_t = t[keep_from:]
+        self.carry_values = values[keep_from:]
+        self.carry_start += keep_from
+
+        # No later maximum can be close enough to the cluster to change it
+        if self.cluster and self.carry_start + 1 - self.cluster[-1][0] >= self.distance:
+            resolved += self.resolve_cluster()
+        return resolved
+
+    def finish(self):
+        # End of the stream: the carried samples hold no more maxima
+        return self.resolve_cluster() if self.cluster else []
+
+def stream_peaks(path, column='z', height=12.0, distance=1000, rows=block_size):
+    """
+    Yields (index, time, value) for every peak of `column` in an export, reading it block by block.
+
+    """
+    finder = StreamPeakFinder(height, distance)
+    for block in iter_blocks(path, ('t', column), rows):
+        yield from finder.feed(block['t'], block[column])
+    yield from finder.finish()
@@ -0,0 +1,195 @@
+"""
+Counting pipeline of one station, shared by the app (main.py), headless.py and soak_test.py.
+
+Every tick, the samples recorded since the previous one are fetched from a source (the phone, a sample
+bus or a replayed recording), resampled to an even grid (see resampler.py), passed to the squat detector
+(see detector.py), checked against the movement classifier (see classifier.py) and split into reps with
+their metrics (see rep_metrics.py), which are counted towards the target. Nothing here touches Tk: the
+pipeline returns what happened as events, and each entry point shows, speaks, prints or publishes them.
+
+Events are (name, fields) pairs:
+
+    connection   state 'ok' or 'lost' (with the error); only when the state changes
+    ignored      label, reps: reps dropped because the movement didn't look like squats
+    rep          count, target, interval, descent, peak_acc, depth
+    target       count, target: the set is complete
+    reset        count, target: the rep after a completed set starts the count over (it isn't counted)
+
+"""
+
+import time
+import phyphox
+import fusion
+from resampler import Resampler
+from rep_metrics import RepTracker
+
+# Phyphox buffers of the signals that are read from a single buffer
+signal_buffers = {'z': 'accZ', 'abs': 'acc'}
+
+class PhoneSource:
+    """
+    Reads a signal ('z', 'abs' or 'fused') from a Phyphox server. With `control` the phone's experiment
+    is started and cleared with the session and its sets (see phyphox.ExperimentControl). While a
+    `classifier` is set (z and abs only), x, y and z are fetched along and passed to it. The fused signal
+    is computed from every acceleration (and gyroscope/magnetometer) sample, like the others.
+
+    """
+    def __init__(self, url, signal='z', control=True, max_buffer=300.0):
+        self.url = url
+        self.signal = signal
+        self.streams = {name: phyphox.BufferStream(url, buffer) for name, buffer in signal_buffers.items()}
+        self.streams['fused'] = phyphox.BufferStream(url, 'accZ', extra_buffers=fusion.fusion_buffers)
+        self.vertical_fusion = fusion.VerticalFusion()
+        self.classifier = None
+        self.experiment = None
+        if control:
+            # A fresh experiment for this session; it is cleared between sets to keep the phone's buffers small
+            self.experiment = phyphox.ExperimentControl(url, self.streams.values(), max_buffer)
+            self.experiment.start_session()
+
+    def set_signal(self, signal):
+        # The new signal is read from its latest sample on; returns True if it changed
+        if signal == self.signal:
+            return False
+        self.signal = signal
+        for stream in self.streams.values():
+            stream.reset()
+        if signal == 'fused':
+            self.set_classifier(None)   # The classifier needs the raw x/y/z samples
+        return True
+
+    def set_classifier(self, classifier):
+        self.classifier = classifier
+        for name in signal_buffers:
+            self.streams[name].extra_buffers = []
+
+    def fetch(self):
+        """
+        Returns (times, values) of the samples recorded since the previous fetch. Connection problems
+        raise requests.exceptions.RequestException.
+
+        """
+        if self.signal == 'fused':
+            # All acceleration (and gyroscope/magnetometer, if available) channels in one request
+            times, buffers = self.streams['fused'].fetch_all()
+            return times, self.vertical_fusion.update_buffers(times, buffers)
+        stream = self.streams[self.signal]
+        if self.classifier is None:
+            return stream.fetch()
+        # x, y and z come along in the same request, at the phone's full rate
+        stream.extra_buffers = [name for name in ('accX', 'accY', 'accZ') if name != stream.buffer_name]
+        times, buffers = stream.fetch_all()
+        self.classifier.add(times, buffers['accX'], buffers['accY'], buffers['accZ'])
+        return times, buffers[stream.buffer_name]
+
+    def fetched(self, seconds_since_rep):
+        # In a long set, clear the phone's buffers once they grow too large (right after a fetch, between reps)
+        if self.experiment is not None:
+            self.experiment.check(seconds_since_rep)
+
+    def new_set(self):
+        if self.experiment is not None:
+            self.experiment.clear()
+
+    def close(self):
+        if self.experiment is not None:
+            self.experiment.end_session()
+
+class CountingPipeline:
+    """
+    Counts the squats of one source: anything with fetch() returning (times, values) of new samples,
+    raising requests.exceptions.RequestException (or another OSError) when the connection is lost.
+    Sources whose samples are already on an even grid (a sample bus) set `resampled`; sources may also
+    have a `classifier`, fetched() (called after each successful fetch) and new_set().
+
+    With a target, reaching it completes the set; the next rep starts the count over without being
+    counted, so a completed set stays on display (and can be saved) until the user goes on.
+
+    """
+    def __init__(self, source, detector, rate=50.0, target=0):
+        self.source = source
+        self.detector = detector
+        self.resampler = None if getattr(source, 'resampled', False) else Resampler(rate)
+        self.rep_tracker = RepTracker()     # Tempo, duration, peak and depth of each rep in the current set
+        self.count = 0
+        self.target = target                # Squats per set (0: no target)
+        self.connected = None
+        self.last_rep_time = time.monotonic()
+
+    @property
+    def classifier(self):
+        return getattr(self.source, 'classifier', None)
+
+    def read(self):
+        """
+        Fetches the new samples and returns (events, (times, values) on the even grid); the block is
+        empty while the connection is lost.
+
+        """
+        events = []
+        try:
+            samples = self.source.fetch()
+            connected = True
+        except OSError as e:     # requests' exceptions are OSErrors too
+            samples = ([], [])
+            connected = False
+            error = str(e)
+        if connected != self.connected:
+            # Only connection changes are reported, not every tick
+            self.connected = connected
+            events.append(('connection', {'state': 'ok'} if connected else {'state': 'lost', 'error': error}))
+        if connected and hasattr(self.source, 'fetched'):
+            self.source.fetched(time.monotonic() - self.last_rep_time)
+        block = self.resampler.feed(*samples) if self.resampler is not None else samples
+        return events, block
+
+    def count_block(self, times, values):
+        """
+        Detects the squats of a block of resampled samples, counts them and returns the events.
+
+        """
+        events = []
+        squat_times = self.detector.extend(values, times)
+        classifier = self.classifier
+        if squat_times and classifier is not None and not classifier.allows_counting():
+            # Lunges, jumps and the like cross the threshold too
+            events.append(('ignored', {'label': classifier.label, 'reps': len(squat_times)}))
+            squat_times = []
+        for rep in self.rep_tracker.add_block(values, times, squat_times):
+            self.last_rep_time = time.monotonic()
+            if self.target and self.count >= self.target:
+                self.new_set()
+                events.append(('reset', {'count': self.count, 'target': self.target}))
+                continue
+            self.count += 1
+            events.append(('rep', {'count': self.count, 'target': self.target, 'interval': rep['interval'],
+                                   'descent': rep['descent'], 'peak_acc': rep['peak_acc'], 'depth': rep['depth']}))
+            if self.count == self.target:
+                events.append(('target', {'count': self.count, 'target': self.target}))
+                if hasattr(self.source, 'new_set'):
+                    self.source.new_set()   # The set is done: clear the phone's buffers
+        return events
+
+    def tick(self):
+        """
+        One round of reading and counting. Returns (events, (times, values)).
+
+        """
+        events, (times, values) = self.read()
+        return events + self.count_block(times, values), (times, values)
+
+    def new_set(self):
+        self.count = 0
+        self.rep_tracker.clear()
+
+    def start_set(self, target):
+        # A new set chosen by the user: a fresh count and a fresh experiment
+        self.target = target
+        self.new_set()
+        if hasattr(self.source, 'new_set'):
+            self.source.new_set()
+
+    def reset_signal(self):
+        # The source switched signals: the resampler's grid starts over
+        if self.resampler is not None:
+            self.resampler.reset()
@@ -0,0 +1,119 @@
+"""
+Per-rep metrics computed while the samples stream in.
+
+Every sample updates a handful of running values (gravity baseline, velocity, position and the
+extremes seen since the last rep), so nothing is re-scanned when a rep is detected.
+
+A rep is detected at its acceleration peak, which is where the squat turns around at the bottom and the
+vertical velocity is about zero. Velocity and position are therefore integrated from one detected bottom
+to the next: the highest position in between is where the user stood up, which splits the segment into
+the ascent of the previous rep and the descent of the current one. The first rep of a set has no
+previous bottom, so (like its interval) its descent and depth are unknown: the segment before it is
+mostly the wait before the set. The depth is approximate: double integration drifts, so the velocity
+leaks slowly towards zero.
+
+"""
+
+import math
+
+velocity_leak_time = 1.0    # Seconds for the integrated velocity to decay by 1/e (limits drift)
+baseline_time = 5.0         # Time constant of the gravity baseline (exponential moving average), seconds
+
+class RepTracker:
+    def __init__(self):
+        self.reps = []              # Metrics of every rep so far, oldest first
+        self.baseline = None
+        self.last_time = None
+        self.last_bottom_time = None
+        self.reset_segment()
+
+    def reset_segment(self):
+        self.velocity = 0.0
+        self.position = 0.0
+        self.top_position = 0.0
+        self.top_time = self.last_time
+        self.peak_acc = float('-inf')
+
+    def add(self, value, t):
+        """
+        Adds one acceleration sample (m/s^2) taken at time t (seconds).
+
+        """
+        if value is None:
+            return
+        if self.baseline is None:
+            self.baseline = value
+            self.last_time = self.top_time = t
+            return
+
+        dt = t - self.last_time
+        self.last_time = t
+        if dt <= 0:
+            return
+
+        # Moving average of the signal tracks gravity; what's left is the motion of the body
+        self.baseline += (1 - math.exp(-dt / baseline_time)) * (value - self.baseline)
+        self.velocity = (self.velocity + (value - self.baseline) * dt) * math.exp(-dt / velocity_leak_time)
+        self.position += self.velocity * dt
+
+        if self.position >= self.top_position:
+            self.top_position = self.position
+            self.top_time = t
+        self.peak_acc = max(self.peak_acc, value)
+
+    def rep_detected(self, t):
+        """
+        Closes the current segment at a detected rep (time t) and returns the new rep's metrics.
+        The ascent of a rep is only known once the user has stood up, so it is filled in on the
+        next rep (or by finish()).
+
+        """
+        if self.reps:
+            self.reps[-1]['ascent'] = round(self.top_time - self.reps[-1]['time'], 3)
+
+        # The top is only that of this rep if the segment started at the previous rep's bottom
+        known_top = self.last_bottom_time is not None and self.top_time is not None
+        rep = {
+            'rep': len(self.reps) + 1,
+            'time': t,
+            'interval': round(t - self.last_bottom_time, 3) if self.last_bottom_time is not None else None,
+            'descent': round(t - self.top_time, 3) if known_top else None,
+            'ascent': None,
+            'peak_acc': round(self.peak_acc, 3) if self.peak_acc != float('-inf') else None,
+            'depth': round(max(self.top_position - self.position, 0.0), 3) if known_top else None,
+        }
+        self.reps.append(rep)
+        self.last_bottom_time = t
+        self.reset_segment()
+        return rep
+
+    def add_block(self, values, times, rep_times=()):
+        """
+        Adds a block of samples, closing a rep at each of `rep_times` (oldest first) as soon as the
+        samples up to it have been added, and returns the metrics of those reps.
+
+        """
+        reps = []
+        pending = list(rep_times)
+        for value, t in zip(values, times):
+            while pending and pending[0] < t:
+                reps.append(self.rep_detected(pending.pop(0)))
+            self.add(value, t)
+        for rep_time in pending:
+            reps.append(self.rep_detected(rep_time))
+        return reps
+
+    def finish(self):
+        """
+        Fills in the ascent of the last rep from the samples seen since and returns all reps.
+
+        """
+        if self.reps and self.reps[-1]['ascent'] is None and self.top_time is not None and self.top_time > self.reps[-1]['time']:
+            self.reps[-1]['ascent'] = round(self.top_time - self.reps[-1]['time'], 3)
+        return self.reps
+
+    def clear(self):
+        # Start a new session, keeping the running baseline
+        self.reps = []
+        self.last_bottom_time = None
+        self.reset_segment()
@@ -0,0 +1,177 @@
+"""
+Reports of the Analyze tab, computed and rendered off the Tk thread.
+
+Each report function queries the history, builds a matplotlib figure and returns it; the ReportWorker
+runs them on a background thread and renders the figure to an image, so the Tk thread only has to show
+the finished picture and counting never pauses for analytics. Starting a new report cancels the one
+still running: the report functions call progress() between their steps, which stops them once they
+are no longer the latest request.
+
+"""
+
+import queue
+import threading
+import history
+
+class Cancelled(Exception):
+    pass
+
+class NoData(Exception):
+    pass
+
+def new_figure(size):
+    # size is (width, height) in pixels
+    from matplotlib.figure import Figure
+    return Figure(figsize=(size[0] / 100, size[1] / 100), dpi=100)
+
+def month_report(user, year, month, month_name, size, progress):
+    import pandas as pd
+    from downsample import plot_decimated
+
+    # The user's days of the month come from an indexed lookup
+    daily_counts = history.daily_counts(user, year, month)
+    if not daily_counts:
+        raise NoData(f"No data available for {user} in the selected month and year!")
+    progress(0.3)
+
+    # Create a DataFrame with all dates in the selected month, missing dates with count 0
+    days_in_month = range(1, 32)  # Assuming maximum of 31 days in a month for simplicity
+    df_month = pd.DataFrame({'Day': days_in_month, 'Count': [daily_counts.get(day, 0) for day in days_in_month]})
+
+    # Group by day and sum the counts
+    df_daily_sum = df_month.groupby('Day')['Count'].sum().reset_index()
+    progress(0.5)
+
+    fig = new_figure(size)
+    ax = fig.add_subplot()
+
+    # Plot the count values for the selected month
+    plot_decimated(ax, df_daily_sum['Day'], df_daily_sum['Count'], marker='o')
+    ax.set_xlabel('Day')
+    ax.set_ylabel('Squats done')
+    ax.set_title(f'Progress report of {user} for {month_name}, {year}')
+
+    # Calculate and display the total count for the month
+    total_count = df_month['Count'].sum()
+    ax.text(0.05, 0.95, f'Total Squats: {total_count}', horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
+
+    # Count the number of days when the count is greater than 10
+    days_gt_10 = (df_month['Count'] > 10).sum()  # Counting days in df_month
+    ax.text(0.05, 0.9, f'Days with Squats > 10: {days_gt_10}', horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
+
+    # Find the longest streak of consecutive days with count > 0
+    streak = 0
+    max_streak = 0
+    for count in df_month['Count']:
+        if count > 0:
+            streak += 1
+        else:
+            max_streak = max(max_streak, streak)
+            streak = 0
+    max_streak = max(max_streak, streak)  # Update max_streak for the last streak
+    ax.text(0.05, 0.85, f'Longest Streak: {max_streak} days', horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
+    return fig
+
+def tempo_report(user, year, month, month_name, size, progress):
+    import pandas as pd
+    from downsample import plot_decimated
+
+    df_selected = pd.DataFrame(history.month_reps(user, year, month), columns=history.rep_columns, dtype=float)
+    if df_selected.empty:
+        raise NoData(f"No rep metrics available for {user} in the selected month and year!")
+    progress(0.3)
+
+    # Average tempo per day
+    df_daily = df_selected.groupby('day')[['interval', 'descent', 'ascent']].mean()
+    progress(0.5)
+
+    fig = new_figure(size)
+    ax = fig.add_subplot()
+    plot_decimated(ax, df_daily.index, df_daily['interval'], marker='o', label='Time between reps')
+    plot_decimated(ax, df_daily.index, df_daily['descent'], marker='v', label='Descent')
+    plot_decimated(ax, df_daily.index, df_daily['ascent'], marker='^', label='Ascent')
+    ax.set_xlim(0.5, 31.5)
+    ax.set_xlabel('Day')
+    ax.set_ylabel('Seconds (daily average)')
+    ax.set_title(f'Tempo of {user} for {month_name}, {year}')
+    ax.legend(loc='upper right')
+
+    ax.text(0.05, 0.95, f'Reps with metrics: {len(df_selected)}', horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
+    ax.text(0.05, 0.9, f'Average peak acceleration: {df_selected["peak_acc"].mean():.1f} m/s\u00b2', horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
+    return fig
+
+def leaderboard_report(user, year, month, month_name, size, progress):
+    # Only the top of the ranking and the user's place are read, however many users there are
+    top = history.leaderboard(year, month, limit=10)
+    if not top:
+        raise NoData("No data available for the selected month and year!")
+    progress(0.3)
+    place, members = history.rank(user, year, month)
+    progress(0.5)
+
+    fig = new_figure(size)
+    ax = fig.add_subplot()
+    names = [name for name, _ in top][::-1]     # Best at the top
+    totals = [total for _, total in top][::-1]
+    bars = ax.barh(names, totals, color=['tab:orange' if name == user else 'tab:blue' for name in names])
+    ax.bar_label(bars, padding=3)
+    ax.set_xlabel('Squats done')
+    ax.set_title(f'Leaderboard for {month_name}, {year}')
+    your_place = f'{user}: place {place} of {members}' if place else f'{user}: no squats yet'
+    ax.text(0.6, 0.05, your_place, horizontalalignment='left', verticalalignment='center', transform=ax.transAxes, fontsize=10)
+    fig.tight_layout()
+    return fig
+
+def render(fig):
+    """
+    Draws a figure with the Agg renderer and returns it as a PIL image.
+
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from PIL import Image
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    return Image.frombuffer('RGBA', canvas.get_width_height(), canvas.buffer_rgba()).copy()
+
+class ReportWorker:
+    """
+    Runs one report at a time on a background thread. Results are (generation, kind, value) tuples in
+    `results`, where kind is 'progress' (fraction done), 'done' (PIL image), 'nodata' (message) or
+    'error' (exception); the Tk thread polls them and ignores those of older generations.
+
+    """
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0     # Number of the latest request; anything older is cancelled
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, report, *args):
+        # Cancels the report still running (if any) and returns the generation of the new one
+        self.generation += 1
+        self.requests.put((self.generation, report, args))
+        return self.generation
+
+    def run(self):
+        while True:
+            generation, report, args = self.requests.get()
+            if generation != self.generation:
+                continue    # Superseded before it started
+
+            def progress(fraction):
+                if generation != self.generation:
+                    raise Cancelled()
+                self.results.put((generation, 'progress', fraction))
+
+            try:
+                fig = report(*args, progress=progress)
+                progress(0.8)
+                image = render(fig)
+                if generation == self.generation:
+                    self.results.put((generation, 'done', image))
+            except Cancelled:
+                pass
+            except NoData as e:
+                self.results.put((generation, 'nodata', str(e)))
+            except Exception as e:
+                self.results.put((generation, 'error', e))
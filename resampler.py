@@ -0,0 +1,96 @@
+"""
+Resampling of timestamped sensor samples to a fixed rate.
+
+The phone samples at its own, slightly irregular rate, and each poll returns however many samples arrived
+since the previous one. The Resampler turns these blocks into one evenly spaced stream (linear
+interpolation on a fixed grid), so that windows and distances downstream can be expressed in seconds and
+processed as whole blocks. It keeps counters of what it had to fix:
+
+    duplicates  samples with the same timestamp as an earlier one (dropped)
+    dropped     samples out of time order or not a number (dropped)
+    gaps        pauses longer than max_gap; the grid restarts after the pause instead of interpolating across it
+    missing     grid points skipped because of gaps
+    restarts    times jumping back (the experiment was cleared or restarted); the grid restarts
+
+"""
+
+import numpy as np
+
+class Resampler:
+    def __init__(self, rate=50.0, max_gap=0.5):
+        self.rate = rate            # Output samples per second
+        self.max_gap = max_gap      # Longest pause (seconds) that is still interpolated across
+        self.counters = dict(received=0, emitted=0, duplicates=0, dropped=0, gaps=0, missing=0, restarts=0)
+        self.reset()
+
+    def reset(self):
+        self.last_time = None       # Last input sample, the left neighbour of the next grid points
+        self.last_value = None
+        self.grid_start = None      # Time of grid point 0; grid point k is at grid_start + k / rate
+        self.grid_index = 0         # Next grid point to emit
+
+    def stats(self):
+        return dict(self.counters)
+
+    def feed(self, times, values):
+        """
+        Adds a block of samples (times in seconds, values) and returns (times, values) of the grid points
+        they complete, as numpy arrays.
+
+        """
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        valid = np.isfinite(times) & np.isfinite(values)
+        self.counters['received'] += len(times)
+        self.counters['dropped'] += int(np.count_nonzero(~valid))
+        times, values = times[valid], values[valid]
+        if not len(times):
+            return np.empty(0), np.empty(0)
+
+        if self.last_time is not None and times[0] < self.last_time - self.max_gap:
+            self.counters['restarts'] += 1
+            self.reset()
+        if self.last_time is not None:
+            times = np.insert(times, 0, self.last_time)
+            values = np.insert(values, 0, self.last_value)
+            known = 1
+        else:
+            known = 0
+
+        # Keep strictly increasing times only
+        previous_max = np.maximum.accumulate(times)[:-1]
+        keep = np.ones(len(times), dtype=bool)
+        keep[1:] = times[1:] > previous_max
+        self.counters['duplicates'] += int(np.count_nonzero(times[1:] == previous_max))
+        self.counters['dropped'] += int(np.count_nonzero(times[1:] < previous_max))
+        times, values = times[keep], values[keep]
+        if len(times) == known:
+            return np.empty(0), np.empty(0)
+        if self.grid_start is None:
+            self.grid_start = times[0]
+
+        out_times, out_values = [], []
+        breaks = np.flatnonzero(np.diff(times) > self.max_gap) + 1
+        for n, (segment_times, segment_values) in enumerate(zip(np.split(times, breaks), np.split(values, breaks))):
+            if n > 0:
+                # Don't make up samples for a pause: skip its grid points and restart the grid after it
+                self.counters['gaps'] += 1
+                self.counters['missing'] += int((segment_times[0] - self.grid_time(self.grid_index)) * self.rate)
+                self.grid_start, self.grid_index = segment_times[0], 0
+            last_index = int(np.floor((segment_times[-1] - self.grid_start) * self.rate + 1e-9))
+            if last_index < self.grid_index:
+                continue
+            grid = self.grid_time(np.arange(self.grid_index, last_index + 1))
+            out_times.append(grid)
+            out_values.append(np.interp(grid, segment_times, segment_values))
+            self.grid_index = last_index + 1
+
+        self.last_time, self.last_value = times[-1], values[-1]
+        if not out_times:
+            return np.empty(0), np.empty(0)
+        out_times, out_values = np.concatenate(out_times), np.concatenate(out_values)
+        self.counters['emitted'] += len(out_times)
+        return out_times, out_values
+
+    def grid_time(self, index):
+        return self.grid_start + index / self.rate
@@ -0,0 +1,223 @@
+"""
+Shared-memory sample bus: one process polls the phone, any number of processes read the samples.
+
+The ingestion process (`serve`) fetches one Phyphox buffer, resamples it to a fixed rate (see
+resampler.py) and writes the samples into a ring in shared memory. Consumers (headless.py --bus, the
+`record` command, or scripts using BusReader) attach to the ring by name and read what's new on every
+tick, so the phone sees one request stream however many consumers there are, and each consumer runs on
+its own core.
+
+Shared memory layout:
+
+    header   int64 [version, capacity, samples written, samples being written, closed, rate in mHz, 0, 0]
+    signal   32 bytes, name of the signal (utf-8)
+    samples  float64 [capacity, 2], rows of (time, value); sample n is in row n % capacity
+
+The writer announces how far it is about to write, fills in the rows, then advances the "samples
+written" counter, so readers never take half-written samples and can tell which of the rows they copied
+were reused meanwhile. A reader keeps its own position; if it falls more than `capacity` samples behind,
+the oldest samples are overwritten and counted as lost.
+
+Usage:
+    python sample_bus.py serve 192.168.0.101
+    python headless.py --bus squat-o-meter
+    python sample_bus.py record session.csv
+
+"""
+
+import argparse
+import csv
+import sys
+import time
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+
+default_bus_name = 'squat-o-meter'
+bus_version = 1
+header_size = 96    # Header fields and the signal name
+
+class SampleBus:
+    """
+    The writing end of the bus. Creates the shared memory; close() removes it.
+
+    """
+    def __init__(self, name=default_bus_name, signal='z', rate=50.0, capacity=60 * 50):
+        self.memory = shared_memory.SharedMemory(name, create=True, size=header_size + capacity * 2 * 8)
+        self.header = np.ndarray(8, dtype=np.int64, buffer=self.memory.buf)
+        self.header[:] = (bus_version, capacity, 0, 0, 0, round(rate * 1000), 0, 0)
+        self.memory.buf[64:96] = signal.encode()[:32].ljust(32, b'\0')
+        self.samples = np.ndarray((capacity, 2), dtype=np.float64, buffer=self.memory.buf, offset=header_size)
+        self.capacity = capacity
+
+    def write(self, times, values):
+        # A block longer than the ring only keeps its latest samples; the others count as written (and so
+        # as lost to every reader)
+        count = len(times)
+        times = np.asarray(times, dtype=float)[-self.capacity:]
+        values = np.asarray(values, dtype=float)[-self.capacity:]
+        written = int(self.header[2]) + count - len(times)
+        start = written % self.capacity
+        self.header[3] = written + len(times)
+        first = min(len(times), self.capacity - start)
+        self.samples[start:start + first, 0] = times[:first]
+        self.samples[start:start + first, 1] = values[:first]
+        self.samples[:len(times) - first, 0] = times[first:]
+        self.samples[:len(times) - first, 1] = values[first:]
+        # Publish only once the rows are complete
+        self.header[2] = written + len(times)
+
+    def close(self):
+        self.header[4] = 1      # Tells the readers no more samples will come
+        del self.header, self.samples
+        self.memory.close()
+        self.memory.unlink()
+
+def attach_memory(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)    # Python 3.13+
+    except TypeError:
+        memory = shared_memory.SharedMemory(name)
+        # Older versions register attached memory with the resource tracker, which would remove the bus
+        # as soon as this consumer exits
+        resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+class BusReader:
+    """
+    The reading end of the bus. Starts at the latest sample, like phyphox.BufferStream; each read()
+    returns the samples written since the previous one. Raises FileNotFoundError if there is no bus.
+    Can be the source of a pipeline.CountingPipeline.
+
+    """
+    resampled = True    # The samples on the bus are on an even grid already
+    def __init__(self, name=default_bus_name):
+        self.memory = attach_memory(name)
+        self.header = np.ndarray(8, dtype=np.int64, buffer=self.memory.buf)
+        if self.header[0] != bus_version:
+            raise ValueError(f"unsupported sample bus version {self.header[0]}")
+        self.capacity = int(self.header[1])
+        self.rate = self.header[5] / 1000      # Samples per second
+        self.signal = bytes(self.memory.buf[64:96]).rstrip(b'\0').decode()
+        self.samples = np.ndarray((self.capacity, 2), dtype=np.float64, buffer=self.memory.buf, offset=header_size)
+        self.position = int(self.header[2])
+        self.lost = 0       # Samples overwritten before this reader got to them
+        self.received = 0   # Samples read
+
+    @property
+    def closed(self):
+        return bool(self.header[4])
+
+    def read(self):
+        """
+        Returns (times, values) of the new samples as float arrays.
+
+        """
+        written = int(self.header[2])
+        start = max(self.position, written - self.capacity)
+        rows = np.arange(start, written) % self.capacity
+        block = self.samples[rows]      # One copy of the new rows, out of the shared memory
+        # Rows the writer reused while they were being copied are no longer the samples we wanted
+        overwritten = max(0, int(self.header[3]) - self.capacity - start)
+        self.lost += start - self.position + min(overwritten, len(block))
+        self.position = written
+        block = block[overwritten:]
+        self.received += len(block)
+        return block[:, 0], block[:, 1]
+
+    def fetch(self):
+        return self.read()
+
+    def close(self):
+        del self.header, self.samples
+        self.memory.close()
+
+def serve(args):
+    import requests as r
+    import phyphox
+    from resampler import Resampler
+
+    stream = phyphox.BufferStream(phyphox.make_url(args.station, args.port), 'acc' if args.signal == 'abs' else 'accZ')
+    resampler = Resampler(args.rate)
+    experiment = phyphox.ExperimentControl(phyphox.make_url(args.station, args.port), [stream], args.max_buffer)
+    experiment.start_session()
+    bus = SampleBus(args.name, args.signal, args.rate, int(args.seconds * args.rate))
+    print(f"Serving {args.signal} samples of {args.station} on sample bus '{args.name}'", file=sys.stderr)
+    connected = None
+    try:
+        while True:
+            tick_start = time.monotonic()
+            try:
+                samples = stream.fetch()
+                if connected is not True:
+                    print("Connected", file=sys.stderr)
+                    connected = True
+            except r.exceptions.RequestException as e:
+                samples = ([], [])
+                if connected is not False:
+                    print(f"Connection lost: {e}", file=sys.stderr)
+                    connected = False
+            if connected:
+                # The bus doesn't know about reps; a clear right after a fetch loses next to nothing
+                experiment.check(float('inf'))
+            bus.write(*resampler.feed(*samples))
+            time.sleep(max(0.0, args.poll - (time.monotonic() - tick_start)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        experiment.end_session()
+        bus.close()
+        print(f"Samples: {resampler.stats()}", file=sys.stderr)
+
+def record(args):
+    # Writes the samples in the Phyphox export format, so recordings work with batch_analyze.py
+    from phyphox_csv import column_names
+    reader = BusReader(args.name)
+    long_names = {short_name: long_name for long_name, short_name in column_names.items()}
+    written = 0
+    with open(args.file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([long_names['t'], long_names[reader.signal]])
+        try:
+            while True:
+                closed = reader.closed
+                times, values = reader.read()
+                writer.writerows(zip(times, values))
+                written += len(times)
+                if closed:
+                    break
+                time.sleep(args.poll)
+        except KeyboardInterrupt:
+            pass
+    print(f"Recorded {written} samples ({reader.lost} lost)", file=sys.stderr)
+    reader.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Share one Phyphox sample stream between processes")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="poll the phone and write its samples to the bus")
+    serve_parser.add_argument('station', help="IP address of the Phyphox server")
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--signal', choices=['z', 'abs'], default='z',
+                              help="acceleration in z direction (default) or absolute acceleration")
+    serve_parser.add_argument('--rate', type=float, default=50, help="samples per second the signal is resampled to")
+    serve_parser.add_argument('--poll', type=float, default=0.1, help="seconds between requests to the phone")
+    serve_parser.add_argument('--seconds', type=float, default=60, help="seconds of samples the ring holds")
+    serve_parser.add_argument('--max-buffer', type=float, default=300,
+                              help="clear the phone's buffers when they hold more than this many seconds of samples")
+
+    record_parser = subparsers.add_parser('record', help="save the samples on the bus to a CSV file")
+    record_parser.add_argument('file', help="output CSV file")
+    record_parser.add_argument('--poll', type=float, default=0.5, help="seconds between reads")
+
+    for subparser in (serve_parser, record_parser):
+        subparser.add_argument('--name', default=default_bus_name, help="name of the bus")
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args)
+    else:
+        record(args)
+
+if __name__ == '__main__':
+    main()
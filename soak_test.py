@@ -0,0 +1,191 @@
+"""
+Soak test: runs the counting pipeline for hours and reports memory growth and tick stability.
+
+Each tick goes through the same stages as the app: the counting pipeline (see pipeline.py: resampling,
+detection, rep metrics), the live plot's envelope, event publishing (to a dashboard that never reads)
+and, every few reps, a background save to a temporary history database. The samples come from a recording replayed in-process (default), or from
+a Phyphox server such as helpful-scripts/phyphox_emulator.py (--station).
+
+Every --report seconds one line of tick statistics and traced memory (tracemalloc) is printed, with the
+allocation sites that grew most since the warm-up. At the end the growth of memory and tick time over the
+run is estimated; the exit status is 1 if either is over its limit.
+
+Usage:
+    python soak_test.py --duration 3600
+    python soak_test.py --station 127.0.0.2 --duration 14400 --report 300
+    python soak_test.py --speed 0 --duration 600        (replay as fast as possible)
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import history
+from phyphox_csv import read_export
+from detector import engines, detector_from_args, add_arguments as add_detector_arguments
+from pipeline import CountingPipeline
+from downsample import minmax_envelope
+from event_server import EventHub
+
+min_growth_kb = 256     # Growth over the whole run below this is measurement noise
+
+class ReplaySource:
+    """
+    Loops a Phyphox CSV export, returning `poll` seconds of recording per fetch().
+
+    """
+    def __init__(self, path, poll, column='z'):
+        df = read_export(path)
+        t = df['t'].to_numpy(dtype=float)
+        self.times = t - t[0]
+        self.values = df[column].to_numpy(dtype=float)
+        self.duration = self.times[-1] + np.median(np.diff(t))
+        self.poll = poll
+        self.now = 0.0
+
+    def fetch(self):
+        start, self.now = self.now, self.now + self.poll
+        loops = np.arange(int(start // self.duration), int(self.now // self.duration) + 1)
+        times = (loops[:, np.newaxis] * self.duration + self.times).ravel()
+        values = np.tile(self.values, len(loops))
+        keep = (times > start) & (times <= self.now)
+        return times[keep], values[keep]
+
+class TickStats:
+    def __init__(self):
+        self.tick_times = []
+        self.periods = []
+
+    def add(self, tick_time, period):
+        self.tick_times.append(tick_time)
+        if period is not None:
+            self.periods.append(period)
+
+    def summary(self):
+        ticks = np.array(self.tick_times) * 1000
+        periods = np.array(self.periods or [0.0]) * 1000
+        return {'ticks': len(ticks), 'tick_mean_ms': ticks.mean(), 'tick_p99_ms': np.percentile(ticks, 99),
+                'tick_max_ms': ticks.max(), 'period_mean_ms': periods.mean(), 'period_jitter_ms': periods.std()}
+
+def top_growth(snapshot, baseline, limit=3):
+    # The allocation sites that grew most since the baseline snapshot
+    stats = snapshot.compare_to(baseline, 'lineno')
+    return [f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno} {stat.size_diff / 1024:+.0f} KB"
+            for stat in stats[:limit] if stat.size_diff > 0]
+
+def run(args):
+    if args.station:
+        import phyphox
+        from pipeline import PhoneSource
+        source = PhoneSource(phyphox.make_url(args.station, args.port), 'z', control=False)
+    else:
+        source = ReplaySource(args.csv, args.poll)
+
+    # Saves go to a throwaway database, never to the user's history
+    history.history_file = os.path.join(tempfile.mkdtemp(prefix='soak_'), 'history.db')
+    import functions
+
+    pipeline = CountingPipeline(source, detector_from_args(args, args.engine), args.rate)
+    detector = pipeline.detector
+    hub = EventHub()
+    hub.subscribe()     # A dashboard that never reads: its queue must stay bounded
+
+    tracemalloc.start()
+    baseline = None
+    reports = []    # (elapsed seconds, traced bytes, tick summary) per report after the warm-up
+    stats = TickStats()
+    started = last_report = time.monotonic()
+    last_tick = None
+    sleep_time = args.poll / args.speed if args.speed else 0.0
+
+    while time.monotonic() - started < args.duration:
+        tick_start = time.perf_counter()
+        events, _ = pipeline.tick()
+        for event, fields in events:
+            if event == 'connection' and fields['state'] == 'lost':
+                print(f"Error: {fields['error']}", file=sys.stderr)
+            hub.publish(event, station='soak', **fields)
+            if event == 'rep' and fields['count'] % args.save_every == 0:
+                functions.save_squat_count_async(args.save_every, reps=pipeline.rep_tracker.finish(), user='soak')
+                pipeline.rep_tracker.clear()
+        if len(detector.data_buffer):
+            minmax_envelope(np.arange(len(detector.data_buffer)), detector.data_buffer, 380)
+        tick_end = time.perf_counter()
+        stats.add(tick_end - tick_start, tick_start - last_tick if last_tick is not None else None)
+        last_tick = tick_start
+
+        now = time.monotonic()
+        if now - last_report >= args.report:
+            last_report = now
+            summary = stats.summary()
+            stats = TickStats()     # Reset before measuring, so the test's own lists don't count as growth
+            snapshot = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+            if baseline is None:
+                baseline = snapshot     # Everything allocated while warming up (imports, caches) is the baseline
+                growth = ''
+            else:
+                reports.append((now - started, traced, summary))
+                growth = '  ' + ', '.join(top_growth(snapshot, baseline))
+            print(f"[{now - started:8.0f} s] {summary['ticks']} ticks, tick {summary['tick_mean_ms']:.2f} ms "
+                  f"(p99 {summary['tick_p99_ms']:.2f}, max {summary['tick_max_ms']:.2f}), period "
+                  f"{summary['period_mean_ms']:.1f} +- {summary['period_jitter_ms']:.1f} ms, memory {traced / 1e6:.2f} MB "
+                  f"(peak {peak / 1e6:.2f}), reps {pipeline.count}{growth}", flush=True)
+
+        if sleep_time:
+            time.sleep(max(0.0, sleep_time - (time.perf_counter() - tick_start)))
+
+    functions.flush_saves()
+    print(f"Resampler: {pipeline.resampler.stats()}")
+    return report_drift(reports, args)
+
+def report_drift(reports, args):
+    """
+    Estimates memory growth (KB per hour) and the change of the tick time over the run, and returns
+    the exit status (1 if over the limits).
+
+    """
+    if len(reports) < 3:
+        print("Run too short to estimate drift (needs at least three reports after the warm-up)")
+        return 0
+    elapsed = np.array([report[0] for report in reports]) / 3600
+    memory_kb = np.array([report[1] for report in reports]) / 1024
+    tick_ms = np.array([report[2]['tick_p99_ms'] for report in reports])
+    memory_slope = np.polyfit(elapsed, memory_kb, 1)[0]
+    # Short runs give noisy slopes; growth is only flagged once it adds up to something measurable
+    memory_growth = memory_slope * (elapsed[-1] - elapsed[0])
+    tick_change = tick_ms[-1] / tick_ms[0] - 1 if tick_ms[0] else 0.0
+
+    problems = []
+    if memory_slope > args.max_growth and memory_growth > min_growth_kb:
+        problems.append(f"memory grows {memory_slope:.0f} KB/h (limit {args.max_growth:.0f})")
+    if tick_change > args.max_slowdown:
+        problems.append(f"p99 tick time grew {tick_change:.0%} (limit {args.max_slowdown:.0%})")
+    print(f"Memory trend {memory_slope:+.0f} KB/h, p99 tick time {tick_ms[0]:.2f} -> {tick_ms[-1]:.2f} ms")
+    print("DRIFT: " + "; ".join(problems) if problems else "OK: no growth or drift detected")
+    return 1 if problems else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the counting pipeline for a long time and report leaks and drift")
+    parser.add_argument('--csv', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'helpful-scripts', '4_squats.csv'),
+                        help="recording to replay (default: helpful-scripts/4_squats.csv)")
+    parser.add_argument('--station', help="read from this Phyphox server instead of replaying")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--duration', type=float, default=3600, help="seconds to run")
+    parser.add_argument('--report', type=float, default=60, help="seconds between reports")
+    parser.add_argument('--poll', type=float, default=0.1, help="seconds between ticks, as in the app")
+    parser.add_argument('--speed', type=float, default=1, help="replay speed-up (0: as fast as possible)")
+    parser.add_argument('--rate', type=float, default=50, help="resampling rate (samples per second)")
+    parser.add_argument('--engine', choices=list(engines), default='peaks', help="detection engine (see detector.py)")
+    add_detector_arguments(parser)
+    parser.add_argument('--save-every', type=int, default=10, help="save a set every this many reps")
+    parser.add_argument('--max-growth', type=float, default=1024, help="allowed memory growth (KB per hour)")
+    parser.add_argument('--max-slowdown', type=float, default=0.5, help="allowed growth of the p99 tick time (0.5 = 50%%)")
+    sys.exit(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
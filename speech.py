@@ -0,0 +1,167 @@
+"""
+Voice feedback for the squat counter.
+
+A single worker thread owns the pyttsx3 engine: it initializes it, caches the voice list and only
+touches the voice/volume properties when they change. Rep counts are queued as "count" cues; a newer
+count replaces any count still waiting, so a worker that falls behind during a fast set skips straight
+to the current rep instead of reading out stale numbers.
+
+Cues can also be pre-rendered to audio files (see prepare_cues). Rendering happens while the worker is
+idle and the files are kept in `cue_cache_dir`, one folder per voice, so later runs reuse them and a
+cached cue costs a file playback instead of a synthesis.
+
+"""
+
+import collections
+import hashlib
+import os
+import threading
+
+try:
+    import winsound     # Windows only; without it cached cues fall back to live synthesis
+except ImportError:
+    winsound = None
+
+speech_rate = 250       # Words per minute
+max_pending = 4         # Upper bound on queued cues; the oldest is dropped when full
+cue_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cue_cache')
+
+pending_cues = collections.deque()
+render_todo = collections.deque()    # (text, voice_index) pairs waiting to be rendered to disk
+cue_condition = threading.Condition()
+settings = {'voice_index': 0, 'volume': 1}
+
+# Voice list, filled in by the worker once the engine is up
+voices = []
+voices_ready = threading.Event()
+
+worker_thread = None
+
+def cue_path(text, voice_index):
+    """
+    Returns the cache file for `text` spoken by the given voice (the file may not exist yet).
+
+    """
+    voice_id = voices[voice_index].id if voice_index < len(voices) else str(voice_index)
+    voice_key = hashlib.sha1(f"{voice_id}|{speech_rate}".encode()).hexdigest()[:12]
+    text_key = hashlib.sha1(text.encode()).hexdigest()[:16]
+    return os.path.join(cue_cache_dir, voice_key, text_key + '.wav')
+
+def speech_worker():
+    import pyttsx3      # Imported here so the engine is only loaded once voice feedback is needed
+    engine = pyttsx3.init()
+    voices.extend(engine.getProperty('voices'))
+    voices_ready.set()
+    engine.setProperty('rate', speech_rate)
+
+    applied = {}
+
+    def apply_settings(wanted):
+        nonlocal applied
+        # Only push properties to the engine when they actually changed
+        if wanted != applied:
+            if voices:
+                engine.setProperty('voice', voices[min(wanted['voice_index'], len(voices) - 1)].id)
+            engine.setProperty('volume', wanted['volume'])
+            applied = wanted
+
+    while True:
+        with cue_condition:
+            while not pending_cues and not render_todo:
+                cue_condition.wait()
+            if pending_cues:
+                text, kind = pending_cues.popleft()
+                to_render = None
+            else:
+                to_render = render_todo.popleft()
+            wanted = dict(settings)
+        if to_render is None and kind == 'stop':
+            break
+
+        if to_render is not None:
+            # Idle: render the next cue to disk at full volume with the voice it was requested for
+            text, voice_index = to_render
+            path = cue_path(text, voice_index)
+            if os.path.exists(path):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            apply_settings(dict(wanted, voice_index=voice_index, volume=1))
+            partial = path[:-len('.wav')] + '.part.wav'
+            try:
+                engine.save_to_file(text, partial)
+                engine.runAndWait()
+                os.replace(partial, path)
+            except Exception as e:
+                # Speech drivers raise all sorts of errors; this thread must survive them or every later
+                # cue goes silent
+                print(f"Error: Could not cache cue '{text}': {e}")
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+            continue
+
+        path = cue_path(text, wanted['voice_index'])
+        if winsound is not None and os.path.exists(path):
+            winsound.PlaySound(path, winsound.SND_FILENAME)
+        else:
+            try:
+                apply_settings(wanted)
+                engine.say(text)
+                engine.runAndWait()
+            except Exception as e:
+                print(f"Error: Could not say '{text}': {e}")
+
+def start():
+    global worker_thread
+    if worker_thread is None:
+        worker_thread = threading.Thread(target=speech_worker, daemon=True)
+        worker_thread.start()
+
+def stop():
+    with cue_condition:
+        pending_cues.clear()
+        pending_cues.append((None, 'stop'))
+        cue_condition.notify()
+
+def prepare_cues(texts, voice_index=None):
+    """
+    Queues `texts` to be rendered to the cue cache for a voice (the current one by default).
+    Cues that are already cached are skipped by the worker. Does nothing without winsound, since cached
+    cues could not be played.
+
+    """
+    if winsound is None:
+        return
+    start()
+    with cue_condition:
+        if voice_index is None:
+            voice_index = settings['voice_index']
+        render_todo.clear()     # Anything still waiting was for an older target or voice
+        render_todo.extend((str(text), voice_index) for text in texts)
+        cue_condition.notify()
+
+def set_voice(voice_index):
+    with cue_condition:
+        settings['voice_index'] = voice_index
+
+def set_volume(volume):
+    with cue_condition:
+        settings['volume'] = volume
+
+def say(text, kind='phrase'):
+    """
+    Queues `text` to be spoken. Cues of kind 'count' supersede any count that has not been spoken yet.
+
+    """
+    start()
+    with cue_condition:
+        if settings['volume'] == 0:
+            return
+        if kind == 'count':
+            for cue in [cue for cue in pending_cues if cue[1] == 'count']:
+                pending_cues.remove(cue)
+        if len(pending_cues) >= max_pending:
+            pending_cues.popleft()
+        pending_cues.append((str(text), kind))
+        cue_condition.notify()